@@ -0,0 +1,93 @@
+"""
+导入耗时预算检查
+
+使用 python -X importtime 分别执行几个常用命令，统计 oh-my-xdu 引入的导入耗时，
+超出预算或导入了不该导入的重量级依赖时以非零状态退出:
+$ python benchmarks/importtime.py --budget 50
+"""
+
+from typing import Dict, List, Tuple
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from subprocess import run, PIPE
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ohmyxdu.profiling import parse_importtime  # noqa: E402
+
+COMMAND = "import sys; sys.argv = {!r}; from ohmyxdu.console import main; main()"
+
+# 这些命令不需要网络，也不应导入任何重量级依赖
+SCENARIOS = {
+    "import ohmyxdu": "import ohmyxdu",
+    "omx version": COMMAND.format(["omx", "version"]),
+    "omx show": COMMAND.format(["omx", "show"]),
+}
+FORBIDDEN = ("lxml", "parsel", "Crypto", "icalendar", "requests", "defopt", "httpx")
+
+
+def measure(code: str, cwd: Path) -> Dict[str, Tuple[int, int, int]]:
+    env = dict(os.environ, DEBUG="1", LOGURU_LEVEL="INFO", PYTHONPATH=str(ROOT))
+    result = run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(cwd),
+        env=env,
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=50, help="每个场景允许的导入耗时（毫秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最小值")
+    args = parser.parse_args()
+
+    failures: List[str] = []
+
+    with TemporaryDirectory() as tmp:
+        cwd = Path(tmp)
+        (cwd / "config.toml").write_text('[CREDENTIALS]\nUSERNAME = "0"\nPASSWORD = ""\n')
+
+        baseline = measure("pass", cwd)
+        # 预热插件清单
+        measure(SCENARIOS["omx show"], cwd)
+
+        for name, code in SCENARIOS.items():
+            costs = []
+            for _ in range(args.repeat):
+                modules = measure(code, cwd)
+                # 只统计 Python 启动之外新增的顶层导入
+                costs.append(
+                    sum(
+                        cumulative
+                        for module, (_, cumulative, level) in modules.items()
+                        if level == 0 and module not in baseline
+                    )
+                    / 1000
+                )
+
+            cost = min(costs)
+            heavy = sorted({m.split(".")[0] for m in modules if m.split(".")[0] in FORBIDDEN})
+
+            print(f"{name:<16} {cost:8.1f} ms  {'重量级依赖: ' + ', '.join(heavy) if heavy else ''}")
+            if cost > args.budget:
+                failures.append(f"{name} 导入耗时 {cost:.1f} ms 超出预算 {args.budget} ms")
+            if heavy:
+                failures.append(f"{name} 导入了 {', '.join(heavy)}")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
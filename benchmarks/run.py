@@ -0,0 +1,149 @@
+"""
+离线性能基准
+
+在本地启动 IDS、ehall、WX 与 ZFW 的替身（见 stub_server.py），所有请求都被转发过去，
+无需校园网与真实账号即可比较登录、各插件与批量执行的耗时与请求数:
+$ python benchmarks/run.py --latency 20 --repeat 5
+$ python benchmarks/run.py --json > result.json
+
+延迟以毫秒计，模拟真实网络往返；请求数与延迟无关，可直接用于比较改动前后的往返次数。
+"""
+
+from typing import Callable, Dict, List
+import sys
+import json
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stub_server import StubServer, StubAdapter  # noqa: E402
+
+from ohmyxdu import OMX  # noqa: E402
+from ohmyxdu.log import logger  # noqa: E402
+from ohmyxdu.auth.pool import install_adapter  # noqa: E402
+from ohmyxdu.auth.ids import sso_registry  # noqa: E402
+from ohmyxdu.security import encode_password  # noqa: E402
+
+
+def credentials(username: str) -> dict:
+    return {"USERNAME": username, "PASSWORD": encode_password("password", username)}
+
+
+def scenarios(save_path: Path) -> Dict[str, Callable[[], object]]:
+    from ohmyxdu.auth.ids import IDSAuth
+    from ohmyxdu.auth.wx import WXAuth
+    from ohmyxdu.auth.zfw import ZFWAuth
+    from ohmyxdu.plugins.get_grade import get_grade, SERVICE_URL as GRADE_SERVICE_URL
+    from ohmyxdu.plugins.get_card_balance import get_card_balance
+    from ohmyxdu.plugins.get_borrowed_books import get_borrowed_books
+    from ohmyxdu.plugins.get_network_usage import get_network_usage
+    from ohmyxdu.plugins.export_class_schedule import export_class_schedule
+
+    return {
+        "login ids": lambda: IDSAuth(GRADE_SERVICE_URL),
+        "login wx": WXAuth,
+        "login zfw": ZFWAuth,
+        "get_grade": get_grade,
+        "get_card_balance": get_card_balance,
+        "get_borrowed_books": get_borrowed_books,
+        "get_network_usage": get_network_usage,
+        "export_class_schedule": lambda: export_class_schedule(save_path=save_path),
+    }
+
+
+def measure(server: StubServer, func: Callable[[], object], repeat: int) -> dict:
+    """
+    冷启动执行 repeat 次，每次执行前让替身上的所有会话失效
+
+    :return: 耗时（毫秒）与每次执行的请求数
+    """
+
+    times: List[float] = []
+    for _ in range(repeat):
+        sso_registry.clear()
+        server.reset(sessions=True)
+        OMX({"CREDENTIALS": credentials("20000000000")})
+
+        start = perf_counter()
+        func()
+        times.append((perf_counter() - start) * 1000)
+
+    return {"min_ms": min(times), "median_ms": median(times), "requests": server.total_requests()}
+
+
+def measure_batch(server: StubServer, users: int, workers: int) -> dict:
+    from ohmyxdu.batch import run_batch
+    from ohmyxdu.plugins.get_grade import get_grade
+
+    sso_registry.clear()
+    server.reset(sessions=True)
+    user_list = [credentials(f"2000000{i:04d}") for i in range(users)]
+
+    start = perf_counter()
+    errors = [r.error for r in run_batch(get_grade, user_list, workers=workers) if r.error]
+    elapsed = perf_counter() - start
+
+    if errors:
+        raise errors[0]
+    return {
+        "users": users,
+        "workers": workers,
+        "total_ms": elapsed * 1000,
+        "users_per_s": users / elapsed,
+        "requests": server.total_requests(),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=10, help="每个请求的模拟延迟（毫秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的重复次数")
+    parser.add_argument("--courses", type=int, default=30, help="课程表中的课程数")
+    parser.add_argument("--grades", type=int, default=60, help="成绩条数")
+    parser.add_argument("--books", type=int, default=25, help="借书记录条数")
+    parser.add_argument("--users", type=int, default=16, help="批量执行的用户数")
+    parser.add_argument("--workers", type=int, default=4, help="批量执行的并发数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    # 只关心耗时，插件本身的输出全部丢弃
+    logger.remove()
+
+    server = StubServer(
+        latency=args.latency / 1000, courses=args.courses, grades=args.grades, books=args.books
+    ).start()
+    install_adapter(StubAdapter(server, pool_maxsize=max(args.workers, 16)))
+
+    results = {}
+    try:
+        with TemporaryDirectory() as tmp:
+            for name, func in scenarios(Path(tmp)).items():
+                results[name] = measure(server, func, args.repeat)
+        results["batch get_grade"] = measure_batch(server, args.users, args.workers)
+    finally:
+        install_adapter(None)
+        server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<24}{'min ms':>10}{'median ms':>12}{'requests':>10}")
+    for name, r in results.items():
+        if "min_ms" in r:
+            print(f"{name:<24}{r['min_ms']:>10.1f}{r['median_ms']:>12.1f}{r['requests']:>10}")
+    batch = results["batch get_grade"]
+    print(
+        f"batch get_grade: {batch['users']} users / {batch['workers']} workers "
+        f"{batch['total_ms']:.1f} ms ({batch['users_per_s']:.1f} users/s, "
+        f"{batch['requests']} requests)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+IDS、ehall、WX 与 ZFW 的本地替身
+
+只实现 oh-my-xdu 实际访问到的接口，按 Host 头区分服务，可配置延迟与数据量。
+配合 StubAdapter 使用时，所有 Auth 发往校园服务的请求都会被转发到这里:
+>>> server = StubServer(latency=0.02).start()
+>>> install_adapter(StubAdapter(server))
+"""
+
+from typing import Dict, Optional, Tuple
+import json
+from time import sleep
+from secrets import token_hex
+from threading import Lock, Thread
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, quote, urlsplit, urlunsplit
+
+from ohmyxdu.auth.pool import SharedAdapter
+
+__all__ = ("StubServer", "StubAdapter")
+
+IDS_HOST = "ids.xidian.edu.cn"
+EHALL_HOST = "ehall.xidian.edu.cn"
+WX_HOST = "202.117.121.7:8080"
+ZFW_HOST = "zfw.xidian.edu.cn"
+
+SEMESTER = "2020-2021-1"
+SEMESTER_START = "2020-08-31 00:00:00"
+WEEKS = 20
+
+IDS_LOGIN_PAGE = """<html><body>
+<form id="pwdFromId" class="loginFromClass" method="post">
+<input type="hidden" name="lt" value="{lt}">
+<input type="hidden" name="dllt" value="generalLogin">
+<input type="hidden" name="execution" value="e1s1">
+<input type="hidden" name="_eventId" value="submit">
+<input type="hidden" name="rmShown" value="1">
+<input type="hidden" id="pwdEncryptSalt" value="{salt}">
+</form>
+{padding}
+</body></html>"""
+
+ZFW_LOGIN_PAGE = """<html><body>
+<form method="post">
+<input type="hidden" name="_csrf-8800" value="{csrf}">
+</form>
+{padding}
+</body></html>"""
+
+
+class StubServer:
+    """
+    校园服务替身
+
+    :param latency: 每个请求的额外延迟（秒）
+    :param courses: 课程表中的课程数
+    :param grades: 成绩条数
+    :param books: 借书记录条数，每页 10 条
+    :param packages: 流量包个数
+    :param page_padding: 登录页等 HTML 的填充字节数，用于模拟真实页面大小
+    """
+
+    BOOKS_PER_PAGE = 10
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        courses: int = 30,
+        grades: int = 60,
+        books: int = 25,
+        packages: int = 2,
+        page_padding: int = 20000,
+    ):
+        self.latency = latency
+        self.courses = courses
+        self.grades = grades
+        self.books = books
+        self.packages = packages
+        self.padding = "<!--" + "x" * page_padding + "-->"
+
+        self.counts: Counter = Counter()
+        self._sessions: Dict[str, set] = {"ids": set(), "ehall": set(), "wx": set(), "zfw": set()}
+        self._lock = Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def start(self) -> "StubServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.handle(self)
+
+            def do_POST(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset(self, *, sessions: bool = False):
+        """清空请求计数，sessions 为真时同时让所有会话失效"""
+
+        with self._lock:
+            self.counts.clear()
+            if sessions:
+                for s in self._sessions.values():
+                    s.clear()
+
+    def total_requests(self) -> int:
+        return sum(self.counts.values())
+
+    # 会话
+    def _new_session(self, kind: str) -> str:
+        value = token_hex(8)
+        with self._lock:
+            self._sessions[kind].add(value)
+        return value
+
+    def _valid(self, kind: str, value: Optional[str]) -> bool:
+        return value is not None and value in self._sessions[kind]
+
+    # 请求处理
+    def handle(self, handler: BaseHTTPRequestHandler):
+        host = handler.headers.get("Host", "")
+        url = urlsplit(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        cookies = {k: m.value for k, m in SimpleCookie(handler.headers.get("Cookie", "")).items()}
+
+        with self._lock:
+            self.counts[(host, url.path)] += 1
+
+        if self.latency:
+            sleep(self.latency)
+
+        route = {
+            IDS_HOST: self._ids,
+            EHALL_HOST: self._ehall,
+            WX_HOST: self._wx,
+            ZFW_HOST: self._zfw,
+        }
+        try:
+            status, headers, payload = route[host](handler, url, body, cookies)
+        except KeyError:
+            status, headers, payload = 404, {}, b"not found"
+
+        handler.send_response(status)
+        for key, value in headers.items():
+            if key == "Set-Cookie":
+                for cookie in value:
+                    handler.send_header(key, cookie)
+            else:
+                handler.send_header(key, value)
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    @staticmethod
+    def _json(data) -> Tuple[int, dict, bytes]:
+        return 200, {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+    @staticmethod
+    def _redirect(location: str, set_cookie=()) -> Tuple[int, dict, bytes]:
+        return 302, {"Location": location, "Set-Cookie": list(set_cookie)}, b""
+
+    @staticmethod
+    def _with_ticket(service: str) -> str:
+        return f"{service}{'&' if '?' in service else '?'}ticket=ST-{token_hex(8)}"
+
+    def _ids(self, handler, url, body, cookies):
+        service = parse_qs(url.query).get("service", [f"http://{EHALL_HOST}/"])[0]
+
+        if handler.command == "GET":
+            if self._valid("ids", cookies.get("CASTGC")):
+                return self._redirect(self._with_ticket(service))
+            page = IDS_LOGIN_PAGE.format(lt=token_hex(8), salt=token_hex(8), padding=self.padding)
+            return 200, {"Content-Type": "text/html"}, page.encode()
+
+        form = parse_qs(body.decode())
+        if not form.get("username") or not form.get("password"):
+            return 200, {"Content-Type": "text/html"}, b"login failed"
+        tgc = self._new_session("ids")
+        return self._redirect(
+            self._with_ticket(service), [f"CASTGC={tgc}; Path=/authserver; HttpOnly"]
+        )
+
+    def _ehall(self, handler, url, body, cookies):
+        query = parse_qs(url.query)
+        if url.path == "/appShow":
+            if "ticket" in query:
+                session = self._new_session("ehall")
+                clean = f"http://{EHALL_HOST}/appShow?appId={query['appId'][0]}"
+                return self._redirect(clean, [f"MOD_AUTH_CAS={session}; Path=/"])
+            if self._valid("ehall", cookies.get("MOD_AUTH_CAS")):
+                return 200, {"Content-Type": "text/html"}, self.padding.encode()
+
+        if not self._valid("ehall", cookies.get("MOD_AUTH_CAS")):
+            service = quote(f"http://{EHALL_HOST}{handler.path}", safe="")
+            return self._redirect(f"http://{IDS_HOST}/authserver/login?service={service}")
+
+        form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        name = url.path.rsplit("/", 1)[-1][: -len(".do")]
+        if name == "dqxnxq":
+            return self._json({"datas": {"dqxnxq": {"rows": [{"DM": SEMESTER}]}}})
+        if name == "cxjcs":
+            return self._json({"datas": {"cxjcs": {"rows": [{"XQKSRQ": SEMESTER_START}]}}})
+        if name == "xskcb":
+            return self._json({"datas": {"xskcb": {"rows": self._course_rows()}}})
+        if name == "xscjcx":
+            page_size = int(form.get("pageSize", 10))
+            page_number = int(form.get("pageNumber", 1))
+            rows = self._grade_rows(form.get("querySetting", "[]"))
+            page = rows[(page_number - 1) * page_size : page_number * page_size]
+            return self._json(
+                {
+                    "datas": {
+                        "xscjcx": {
+                            "rows": page,
+                            "totalSize": len(rows),
+                            "pageSize": page_size,
+                            "pageNumber": page_number,
+                        }
+                    },
+                    "code": "0",
+                }
+            )
+        return 404, {}, b"not found"
+
+    def _course_rows(self):
+        rows = []
+        for i in range(self.courses):
+            # 前后几周无课，中间偶尔停课，与真实课表类似
+            weeks = ["0"] * WEEKS
+            for week in range(i % 3, WEEKS - i % 4):
+                weeks[week] = "0" if (week + i) % 7 == 0 else "1"
+            rows.append(
+                {
+                    "KCH": f"C{i:05d}",
+                    "KCM": f"课程{i}",
+                    "JASMC": f"B-{100 + i}" if i % 5 else None,
+                    "SKXQ": str(i % 7 + 1),
+                    "KSJC": str(i % 5 * 2 + 1),
+                    "JSJC": str(i % 5 * 2 + 2),
+                    "SKZC": "".join(weeks),
+                }
+            )
+        return rows
+
+    def _grade_rows(self, query_setting: str):
+        semesters = ["2019-2020-1", "2019-2020-2", SEMESTER]
+        rows = [
+            {
+                "KCH": f"C{i:05d}",
+                "XSKCM": f"课程{i}",
+                "XNXQDM": semesters[i % len(semesters)],
+                "XNXQDM_DISPLAY": semesters[i % len(semesters)],
+                "ZCJ": 50 + i % 50,
+                "XFJD": round(1 + i % 30 / 10, 1) if i % 4 else None,
+            }
+            for i in range(self.grades)
+        ]
+        for condition in json.loads(query_setting):
+            if condition.get("builder") == "m_value_equal":
+                rows = [r for r in rows if r.get(condition["name"]) == condition["value"]]
+        return rows
+
+    def _wx(self, handler, url, body, cookies):
+        if url.path == "/baseCampus/login/login.do":
+            return self._json({"isConfirm": 1, "token": [self._new_session("wx"), "190"]})
+
+        token = handler.headers.get("token", "").split("_")[0]
+        if not self._valid("wx", token):
+            return self._json({"msgState": -1, "msg": "登录已失效，请重新登录"})
+
+        param = json.loads(json.loads(body.decode())["param"])
+        if url.path == "/oaCampus/library/getReturn.do":
+            offset = int(param["offset"])
+            start = (offset - 1) * self.BOOKS_PER_PAGE
+            if start >= self.books:
+                return self._json({"msgState": 0})
+            books = [
+                {"title": f"书{i}", "returnDate": f"2020-12-{i % 28 + 1:02d}"}
+                for i in range(start, min(start + self.BOOKS_PER_PAGE, self.books))
+            ]
+            return self._json({"msgState": 1, "list": books})
+        if url.path == "/infoCampus/playCampus/getAllPurposeCard.do":
+            return self._json({"allPurposeCardVO": {"cardGeneralInfo": [{"value": "12345"}]}})
+        return 404, {}, b"not found"
+
+    def _zfw(self, handler, url, body, cookies):
+        if url.path in ("", "/"):
+            if handler.command == "GET":
+                page = ZFW_LOGIN_PAGE.format(csrf=token_hex(8), padding=self.padding)
+                return 200, {"Content-Type": "text/html"}, page.encode()
+            session = self._new_session("zfw")
+            return self._redirect(f"https://{ZFW_HOST}/home", [f"PHPSESSID={session}; Path=/"])
+
+        if url.path == "/home":
+            if not self._valid("zfw", cookies.get("PHPSESSID")):
+                return self._redirect(f"https://{ZFW_HOST}/")
+            rows = "".join(
+                f"<tr><td>套餐{i}</td><td>{i}G</td><td>10G</td><td>0G</td>"
+                f"<td>2020-12-01</td><td>2021-12-01</td></tr>"
+                for i in range(self.packages)
+            )
+            page = f'<div id="w3-container"><table><tbody>{rows}</tbody></table></div>'
+            return 200, {"Content-Type": "text/html"}, page.encode()
+        return 404, {}, b"not found"
+
+
+class StubAdapter(SharedAdapter):
+    """把所有请求转发到 StubServer，同时保持原始 URL，cookie 与重定向都按真实主机处理"""
+
+    def __init__(self, server: StubServer, **kwargs):
+        self.server = server
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        original_url = request.url
+        url = urlsplit(original_url)
+
+        request.url = urlunsplit(("http", f"127.0.0.1:{self.server.port}", url.path, url.query, ""))
+        request.headers["Host"] = url.netloc
+        try:
+            response = super().send(request, **kwargs)
+        finally:
+            request.url = original_url
+            del request.headers["Host"]
+
+        response.url = original_url
+        return response
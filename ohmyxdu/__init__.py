@@ -1,27 +1,18 @@
-from typing import List, Callable, Optional
-from os import environ
-from sys import path
+from typing import TYPE_CHECKING, Dict, List, Callable, Optional
+from sys import argv, path
 from copy import deepcopy
 from pathlib import Path
 from importlib import import_module
 
-from toml import dumps, loads
-from defopt import run
+from ohmyxdu.globals import get_config, set_config, set_current_omx, set_current_plugin
+from ohmyxdu.log import logger
 
-from ohmyxdu.globals import get_config, set_config, set_current_omx
+if TYPE_CHECKING:
+    from ohmyxdu.manifest import PluginInfo
 
 __all__ = ("__version__", "OMX")
 __version__ = "0.1.4"
 
-debug = bool(environ.get("DEBUG"))
-if not debug and not environ.get("LOGURU_LEVEL"):
-    # 正式环境关掉 DEBUG 日志
-    environ["LOGURU_LEVEL"] = "INFO"
-
-# 要为调整日志等级违反一下 PEP 8
-# TODO:重写log handler
-from loguru import logger
-
 
 class OMX:
     """
@@ -48,28 +39,51 @@ class OMX:
     >>> omx = OMX.from_config_file(Path('~/omx.toml'))
 
     2.执行脚本
-    OMX 对象初始完成后即可直接引入 ohmyxdu.plugins 下的插件。同时，你还可以从 omx.plugins 中获取当前所有可用的插件
+    OMX 对象初始完成后即可直接引入 ohmyxdu.plugins 下的插件。同时，你还可以从 omx.plugins 中获取当前所有可用的插件，
+    或从 omx.manifest 中查看插件信息而不导入插件
     """
 
-    plugins: List[Callable[..., None]]
     config_path = Optional[Path]
+    data_path: Optional[Path]
 
     def __init__(self, config: dict):
-        self.plugins = []
+        self._plugins: Optional[List[Callable[..., None]]] = None
+        self._manifest: Optional[Dict[str, "PluginInfo"]] = None
         self.config_path = None
+        self.data_path = None  # 会话等本地数据的存放目录，为空时不做持久化
 
         set_config(config)
         set_current_omx(self)
 
-        lib_path = Path(__file__).parent
+    @property
+    def manifest(self) -> Dict[str, "PluginInfo"]:
+        """插件清单，由源码静态解析而来，不会导入任何插件"""
+
+        if self._manifest is None:
+            from ohmyxdu.manifest import load_manifest
 
-        builtin_path = lib_path / "builtins"
-        plugins_path = lib_path / "plugins"
+            self._manifest = load_manifest(self.data_path)
+        return self._manifest
 
-        self.load_plugin_here(builtin_path)  # 内建插件不会有返回值，目前其对应的函数不应该直接被调用
-        self.load_plugin_here(plugins_path)
+    @property
+    def plugins(self) -> List[Callable[..., None]]:
+        """当前所有可用的插件，首次访问时会导入全部插件，只需单个插件时请使用 load_plugin"""
 
-        logger.debug(f"已加载插件{self.plugins}")
+        if self._plugins is None:
+            self._plugins = [self.load_plugin(name) for name in self.manifest]
+            logger.debug("已加载插件 {}", self._plugins)
+        return self._plugins
+
+    def load_plugin(self, name: str) -> Callable[..., None]:
+        """
+        仅导入指定插件
+
+        :param name: 插件名，如 get_grade
+        :return: 插件函数
+        """
+
+        info = self.manifest[name]
+        return getattr(import_module(info.module), info.name)
 
     @staticmethod
     def from_config_file(config_path: Path) -> "OMX":
@@ -80,6 +94,8 @@ class OMX:
         :return:
         """
 
+        from toml import loads
+
         try:
             config_text = loads(config_path.read_text())
         except FileNotFoundError:
@@ -92,6 +108,7 @@ class OMX:
 
         r = OMX(config_text)
         r.config_path = config_path
+        r.data_path = config_path.parent
         return r
 
     def dump_config_file(self, config_path: Optional[Path] = None):
@@ -101,6 +118,8 @@ class OMX:
         :param config_path: 配置文件路径，留空代表写回生成 OMX 对象时使用的配置文件
         """
 
+        from toml import dumps
+
         config_text = dumps(get_config())
 
         if config_path is not None:
@@ -114,7 +133,7 @@ class OMX:
 
     def load_plugin_here(self, current_path: Path):
         """
-        加载指定目录下的可用插件
+        加载指定目录下的可用插件，用于清单之外的额外插件目录
 
         :param current_path: 目标目录
         """
@@ -152,5 +171,33 @@ class OMX:
         config.update(basic_config)
         self.dump_config_file()
 
-    def run(self):
-        run(logger.catch(plugin) for plugin in self.plugins)
+    def run(self, args: Optional[List[str]] = None):
+        """
+        执行命令行指定的插件
+
+        :param args: 命令行参数，默认为 sys.argv[1:]
+        """
+
+        if args is None:
+            args = argv[1:]
+
+        name = args[0].replace("-", "_") if args else None
+        if name not in self.manifest:
+            # 帮助信息与错误提示直接由插件清单生成
+            from ohmyxdu.manifest import index_parser
+
+            index_parser(self.manifest, __version__).parse_args(args)
+            return
+
+        # 只导入要执行的插件
+        plugin = logger.catch(self.load_plugin(name))
+        set_current_plugin(name)
+
+        if len(args) == 1 and all(p["has_default"] for p in self.manifest[name].params):
+            # 没有命令行参数且所有参数都有默认值，不必构造参数解析器
+            plugin()
+            return
+
+        from defopt import run
+
+        run([plugin], argv=args)
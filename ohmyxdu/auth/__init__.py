@@ -1,44 +1,228 @@
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from http.cookiejar import CookieJar
+from time import perf_counter
 
-from loguru import logger
 from requests import Session
 
-from ohmyxdu.globals import get_config
+from ohmyxdu.globals import get_config, get_current_plugin
+from ohmyxdu.log import logger
 from ohmyxdu.security import decode_password
+from ohmyxdu.auth.session import SavedSession, get_session_store, load_cookies
+from ohmyxdu.auth.pool import get_shared_adapter, get_timeout
+from ohmyxdu.auth import warm
 from ohmyxdu.utils.data_structure import Secret
 
-__all__ = ("Auth",)
+__all__ = ("RequestRecord", "BaseAuth", "Auth")
 
 
-# TODO:独立验证模块
-class Auth(Session):
-    """抽象验证模型"""
+class RequestRecord(NamedTuple):
+    """单个请求的统计信息，自动跟随的重定向算作同一个请求"""
+
+    auth_name: Optional[str]
+    plugin: Optional[str]  # 发起请求的插件，不在插件中时为 None
+    method: str
+    url: str
+    status: Optional[int]  # 请求失败（如超时）时为 None
+    elapsed: float  # 秒，包含重定向
+    size: int  # 响应体字节数
+    redirects: int
+
+
+class BaseAuth:
+    """
+    与 HTTP 后端无关的验证逻辑：账号密码的继承与会话存储
+
+    同步的 Auth 与 ohmyxdu.auth.aio 中的异步实现共用这部分
+    """
 
     AUTH_NAME: Optional[str] = None  # 所有派生类都应提供该参数，大写
-    credentials: Dict[str, Any]
 
-    def __init__(self):
-        super().__init__()
+    # 进程内所有验证会话共用的请求钩子，没有钩子时不做任何统计
+    request_hooks: List[Callable[[RequestRecord], None]] = []
+    credentials: Dict[str, Any]
 
+    def load_credentials(self):
         # 全局认证信息
         self.credentials = get_config()["CREDENTIALS"]
 
         # 来自 AUTH_NAME 的特定性验证信息
         self.specificity_credentials = self.credentials.get(self.AUTH_NAME, {})
 
+        # 账号密码在整个验证会话中不会变化，首次使用时解析一次即可
+        self._username: Optional[str] = None
+        self._password: Optional[Secret] = None
+
+    @staticmethod
+    def add_request_hook(hook: Callable[[RequestRecord], None]):
+        """
+        注册请求钩子，之后每个请求完成（或失败）时都会以 RequestRecord 调用
+
+        :param hook: 钩子，会在发起请求的线程中同步调用，应尽量轻量
+        """
+
+        BaseAuth.request_hooks.append(hook)
+
+    @staticmethod
+    def remove_request_hook(hook: Callable[[RequestRecord], None]):
+        BaseAuth.request_hooks.remove(hook)
+
+    def notify_request(self, method: str, url: str, started: float, response: Any = None):
+        """
+        将一次请求的结果交给所有钩子
+
+        :param method: 请求方法
+        :param url: 请求的 URL
+        :param started: 请求开始时的 perf_counter()
+        :param response: 响应，requests 与 httpx 的响应均可，请求失败时为 None
+        """
+
+        elapsed = perf_counter() - started
+        if response is None:
+            record = RequestRecord(
+                self.AUTH_NAME, get_current_plugin(), method.upper(), str(url), None, elapsed, 0, 0
+            )
+        else:
+            record = RequestRecord(
+                self.AUTH_NAME,
+                get_current_plugin(),
+                method.upper(),
+                str(url),
+                response.status_code,
+                elapsed,
+                len(response.content),
+                len(response.history),
+            )
+
+        for hook in self.request_hooks:
+            hook(record)
+
+    @property
+    def cookie_jar(self) -> CookieJar:
+        """底层的 http.cookiejar.CookieJar，由具体 HTTP 后端提供"""
+
+        raise NotImplementedError
+
+    @classmethod
+    def resolve_username(cls) -> str:
+        """
+        不构造验证会话，按当前配置得出该验证使用的账号，与 username 的继承规则相同
+
+        :return: [CREDENTIALS.<AUTH_NAME>] 中的账号，没有时为通用账号
+        """
+
+        credentials = get_config()["CREDENTIALS"]
+        username = credentials.get(cls.AUTH_NAME, {}).get("USERNAME")
+        return username or credentials["USERNAME"]
+
     @property
     def username(self) -> str:
+        if self._username is not None:
+            return self._username
+
         username = self.specificity_credentials.get("USERNAME")
         if not username:
             username = self.credentials["USERNAME"]
             logger.debug("未能找到 {} 对应的账号，使用通用账号。", self.AUTH_NAME)
+        self._username = username
         return username
 
     @property
     def password(self) -> Secret:
+        if self._password is not None:
+            return self._password
+
         # 注意：所有敏感信息（如密码）都应被转为 Secret 对象
         password = Secret(self.specificity_credentials.get("PASSWORD", ""))
         if not password:
             password = Secret(self.credentials["PASSWORD"])
             logger.debug("未能找到 {} 对应的密码，使用通用密码。", self.AUTH_NAME)
-        return Secret(decode_password(str(password), self.username))
+        self._password = Secret(decode_password(str(password), self.username))
+        return self._password
+
+    def restore_session(self, scope: str = "") -> Optional[SavedSession]:
+        """
+        从本地会话存储中恢复 cookie
+
+        :param scope: 作用域，同一验证下区分不同服务
+        :return: 恢复成功时返回保存的会话，否则为 None
+        """
+
+        store = get_session_store()
+        if store is None:
+            return None
+
+        saved = store.load(self.AUTH_NAME, self.username, scope)
+        if saved is None:
+            return None
+
+        load_cookies(self.cookie_jar, saved.cookies)
+        logger.debug("已恢复 {} 的会话，保存于 {:.0f} 秒前", self.AUTH_NAME, saved.age)
+        return saved
+
+    def persist_session(self, scope: str = "", data: Optional[Dict[str, Any]] = None):
+        """
+        将当前会话写入本地会话存储
+
+        :param scope: 作用域
+        :param data: 附带的其他信息，例如 token
+        """
+
+        store = get_session_store()
+        if store is not None:
+            store.save(self.AUTH_NAME, self.username, scope, self.cookie_jar, data)
+
+    def forget_session(self, scope: str = ""):
+        """丢弃本地保存的会话"""
+
+        store = get_session_store()
+        if store is not None:
+            store.drop(self.AUTH_NAME, self.username, scope)
+
+
+class _Reusable(type):
+    """安装了 ohmyxdu.auth.warm.SessionCache 时，构造验证会话改为从缓存中取出"""
+
+    def __call__(cls, *args, **kwargs):
+        cache = warm.get_session_cache()
+        if cache is None:
+            return type.__call__(cls, *args, **kwargs)
+        return cache.get(cls, args, kwargs, lambda: type.__call__(cls, *args, **kwargs))
+
+
+# TODO:独立验证模块
+class Auth(BaseAuth, Session, metaclass=_Reusable):
+    """抽象验证模型"""
+
+    def __init__(self):
+        super().__init__()
+        self.load_credentials()
+
+        # 共用进程内的连接池，cookie 仍由各自的 Session 保存
+        adapter = get_shared_adapter()
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.timeout = get_timeout()
+
+    @property
+    def cookie_jar(self) -> CookieJar:
+        return self.cookies
+
+    def keep_alive(self):
+        """
+        保持会话有效，失效时重新登录，供常驻进程定期调用
+
+        默认什么也不做，适用于无法低成本确认会话状态、或在请求被拒绝时会自动重新登录的验证
+        """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.request_hooks:
+            return super().request(method, url, **kwargs)
+
+        started = perf_counter()
+        response = None
+        try:
+            response = super().request(method, url, **kwargs)
+            return response
+        finally:
+            self.notify_request(method, url, started, response)
@@ -0,0 +1,113 @@
+"""
+异步验证模型，基于 httpx
+
+需额外安装 httpx：pip install oh-my-xdu[async]
+
+配置与同步版本一样来自 ohmyxdu.globals，每个 asyncio 任务拥有独立的上下文，
+在任务内构造 OMX 对象即可让不同任务使用不同用户:
+>>> async def task(config):
+...     OMX(config)
+...     return await get_grade_async()
+"""
+
+from typing import Any, Callable, Dict, Optional, TypeVar
+from asyncio import get_running_loop
+from contextvars import copy_context
+from functools import partial
+from http.cookiejar import CookieJar
+from time import perf_counter
+
+try:
+    from httpx import AsyncClient, Timeout
+except ImportError as e:
+    raise ImportError("异步支持需要 httpx，请使用 pip install oh-my-xdu[async] 安装") from e
+
+from ohmyxdu.auth import BaseAuth
+from ohmyxdu.auth.pool import get_timeout
+from ohmyxdu.auth.session import SavedSession
+
+T = TypeVar("T")
+
+__all__ = ("AsyncAuth",)
+
+
+class AsyncAuth(BaseAuth, AsyncClient):
+    """
+    异步抽象验证模型
+
+    构造函数不能 await，需调用 authenticate 完成登录，推荐在协程中直接使用:
+    token = await AsyncIDSAuth.create(service_url)
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("follow_redirects", True)  # 与 requests 的默认行为保持一致
+        kwargs.setdefault("timeout", self.default_timeout())
+        super().__init__(**kwargs)
+        self.load_credentials()
+
+    @staticmethod
+    def default_timeout() -> Timeout:
+        """
+        与同步版本相同的 [NETWORK] 超时
+
+        :return: requests 的 (连接超时, 读取超时) 转为 httpx 的形式
+        """
+
+        timeout = get_timeout()
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return Timeout(read, connect=connect)
+        return Timeout(timeout)
+
+    @property
+    def cookie_jar(self) -> CookieJar:
+        return self.cookies.jar
+
+    async def request(self, method, url, **kwargs):
+        if not self.request_hooks:
+            return await super().request(method, url, **kwargs)
+
+        started = perf_counter()
+        response = None
+        try:
+            response = await super().request(method, url, **kwargs)
+            return response
+        finally:
+            self.notify_request(method, url, started, response)
+
+    @staticmethod
+    async def _in_thread(func: Callable[..., T], *args) -> T:
+        # 会话存储读写文件，放到线程中以免阻塞事件循环，配置在上下文变量中，需一并带过去
+        call = partial(copy_context().run, func, *args)
+        return await get_running_loop().run_in_executor(None, call)
+
+    async def restore_session_async(self, scope: str = "") -> Optional[SavedSession]:
+        """restore_session 的异步版本，文件读写不阻塞事件循环"""
+
+        return await self._in_thread(self.restore_session, scope)
+
+    async def persist_session_async(self, scope: str = "", data: Optional[Dict[str, Any]] = None):
+        """persist_session 的异步版本，文件读写不阻塞事件循环"""
+
+        await self._in_thread(self.persist_session, scope, data)
+
+    async def authenticate(self):
+        """完成登录，所有派生类都应实现"""
+
+        raise NotImplementedError
+
+    @classmethod
+    async def create(cls, *args, **kwargs) -> "AsyncAuth":
+        """
+        构造并登录
+
+        :return: 已登录的验证会话，用完后需 await aclose()
+        """
+
+        auth = cls(*args, **kwargs)
+        try:
+            await auth.authenticate()
+        except BaseException:
+            await auth.aclose()
+            raise
+        return auth
@@ -0,0 +1,78 @@
+from ohmyxdu.log import logger
+from ohmyxdu.auth.aio import AsyncAuth
+from ohmyxdu.auth.ids import (
+    IDSAuth,
+    login_form,
+    is_login_url,
+    ticket_granting_cookies,
+    sso_registry,
+)
+from ohmyxdu.auth.session import load_cookies
+
+__all__ = ("AsyncIDSAuth",)
+
+
+class AsyncIDSAuth(AsyncAuth):
+    """统一身份验证（异步）"""
+
+    AUTH_NAME = IDSAuth.AUTH_NAME
+    AUTH_URL = IDSAuth.AUTH_URL
+    SESSION_TRUST_TIME = IDSAuth.SESSION_TRUST_TIME
+
+    def __init__(self, service_url: str, **kwargs):
+        """
+        :param service_url: 需要使用 IDS 验证的服务 URL
+        """
+
+        super().__init__(**kwargs)
+        self.service_url = service_url
+
+    async def authenticate(self):
+        # 流程与 IDSAuth 相同：本地会话 -> 单点登录 -> 完整登录
+        saved = await self.restore_session_async(self.service_url)
+        if saved is not None:
+            if saved.age < self.SESSION_TRUST_TIME or await self.is_session_alive():
+                return
+            logger.debug("保存的会话已失效，重新登录")
+            self.cookies.clear()
+
+        if not await self.login_with_ticket():
+            self.cookies.clear()
+            await self.login()
+            sso_registry.set(self.username, ticket_granting_cookies(self.cookie_jar, self.AUTH_URL))
+            await self.persist_session_async()
+
+        await self.persist_session_async(self.service_url)
+
+    async def login_with_ticket(self) -> bool:
+        cookies = sso_registry.get(self.username)
+        if cookies is None:
+            if await self.restore_session_async() is None:
+                return False
+            cookies = ticket_granting_cookies(self.cookie_jar, self.AUTH_URL)
+        else:
+            load_cookies(self.cookie_jar, cookies)
+
+        resp = await self.get(self.AUTH_URL, params={"service": self.service_url})
+        if is_login_url(str(resp.url)):
+            logger.debug("IDS 单点登录凭据已失效")
+            sso_registry.discard(self.username)
+            return False
+
+        sso_registry.set(self.username, cookies)
+        return True
+
+    async def is_session_alive(self) -> bool:
+        resp = await self.get(self.service_url, follow_redirects=False)
+        return not (resp.is_redirect and is_login_url(resp.headers.get("Location", "")))
+
+    async def login(self):
+        params = {"service": self.service_url}
+        resp = await self.get(self.AUTH_URL, params=params)
+
+        data = login_form(resp.text, self.username, self.password)
+        # requests 会丢弃值为 None 的字段，httpx 则会转为空串
+        data = {key: value for key, value in data.items() if value is not None}
+
+        await self.post(self.AUTH_URL, params=params, data=data)
+        await self.get(self.service_url)
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Optional
+from asyncio import Lock
+
+from ohmyxdu.log import logger
+from ohmyxdu.auth.aio import AsyncAuth
+from ohmyxdu.auth.wx import WXAuth
+
+__all__ = ("AsyncWXAuth",)
+
+
+class AsyncWXAuth(AsyncAuth):
+    AUTH_NAME = WXAuth.AUTH_NAME
+    AUTH_URL = WXAuth.AUTH_URL
+    LOGIN_URL = WXAuth.LOGIN_URL
+
+    async def authenticate(self):
+        self._login_lock = Lock()
+
+        saved = await self.restore_session_async()
+        token = saved.data.get("token") if saved is not None else None
+        if token:
+            logger.debug("使用保存于 {:.0f} 秒前的 token", saved.age)
+            self.headers["token"] = token
+            return
+
+        await self.login()
+
+    async def login(self):
+        data = {"userName": self.username, "password": str(self.password), "schoolId": 190}
+        resp = await super().post(self.LOGIN_URL, json=WXAuth.signed_payload(data))
+
+        token = WXAuth.parse_token(resp.json())
+        self.headers["token"] = token
+        await self.persist_session_async(data={"token": token})
+
+    async def relogin(self, stale_token: Optional[str]):
+        async with self._login_lock:
+            if self.headers.get("token") != stale_token:
+                return
+            logger.debug("token 已失效，重新登录")
+            await self.login()
+
+    async def post(self, url: str, data: Optional[Dict[str, Any]] = None, **kwargs):
+        token = self.headers.get("token")
+        resp = await super().post(url, json=WXAuth.signed_payload(data), **kwargs)
+
+        try:
+            expired = WXAuth.is_token_expired(resp.json())
+        except ValueError:
+            return resp
+        if not expired:
+            return resp
+
+        await self.relogin(token)
+        return await super().post(url, json=WXAuth.signed_payload(data), **kwargs)
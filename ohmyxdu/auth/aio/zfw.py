@@ -0,0 +1,18 @@
+from ohmyxdu.auth.aio import AsyncAuth
+from ohmyxdu.auth.zfw import ZFWAuth, login_form
+
+__all__ = ("AsyncZFWAuth",)
+
+
+class AsyncZFWAuth(AsyncAuth):
+    AUTH_NAME = ZFWAuth.AUTH_NAME
+    AUTH_URL = ZFWAuth.AUTH_URL
+
+    async def authenticate(self):
+        # 绕过验证码
+        headers = {"User-Agent": "Mobile"}
+
+        resp = await self.get(self.AUTH_URL, headers=headers)
+        data = login_form(resp.text, self.username, self.password)
+
+        await self.post(self.AUTH_URL, data=data, headers=headers)
@@ -1,14 +1,16 @@
+from typing import Any, Dict, List, Optional
+from http.cookiejar import CookieJar
 from secrets import token_urlsafe
 from base64 import b64encode
+from threading import Lock
+from urllib.parse import urlparse
 
-from loguru import logger
-from parsel import Selector
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-
+from ohmyxdu.log import logger
 from ohmyxdu.auth import Auth
+from ohmyxdu.auth.session import dump_cookies, load_cookies
+from ohmyxdu.utils.data_structure import Secret
 
-__all__ = ("IDSAuth",)
+__all__ = ("IDSAuth", "SSORegistry", "sso_registry", "login_form")
 
 
 def encrypt(key: bytes, value: bytes):
@@ -19,6 +21,9 @@ def encrypt(key: bytes, value: bytes):
     :param value:
     :return:
     """
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import pad
+
     # 别学这个登录流程，正确方法可以去看一下非对称密码。
     # 如果需在不可信信道传递信息的话请优先考虑 TLS1.3+(HTTPS), Noise Protocol 等专业设施
     # 其实这里只要有一处随机即可，两次随机并不能有效增加安全性
@@ -28,40 +33,190 @@ def encrypt(key: bytes, value: bytes):
     return b64encode(box.encrypt(pad(token_urlsafe(48).encode() + value, block_size=16)))
 
 
+def login_form(html_text: str, username: str, password: Secret) -> Dict[str, Any]:
+    """
+    由登录页构造登录表单
+
+    :param html_text: IDS 登录页
+    :param username: 用户名
+    :param password: 明文密码
+    :return: 可直接 POST 的表单
+    """
+
+    from parsel import Selector
+
+    html = Selector(html_text)
+    hidden_tags = html.css(".loginFromClass input[type=hidden]")
+
+    data = {
+        tag.attrib["name"]: tag.attrib.get("value") for tag in hidden_tags if "name" in tag.attrib
+    }
+    # 在填入账号密码之前记录，密码不应出现在日志中
+    logger.debug("登录表单: {}", data)
+    data.update({"username": username, "password": password})
+
+    key = html.css("input#pwdEncryptSalt").attrib["value"]
+    data["password"] = encrypt(key.encode(), str(data["password"]).encode()).decode()
+    return data
+
+
+def is_login_url(url: str) -> bool:
+    """URL 是否指向 IDS 登录页，用于判断会话或 ticket-granting cookie 是否失效"""
+
+    return "/authserver/login" in url
+
+
+def ticket_granting_cookies(jar: CookieJar, auth_url: str) -> List[Dict[str, Any]]:
+    """
+    cookie jar 中属于 IDS 的 cookie，其他服务可凭此免密登录
+
+    :param jar: 会话的 cookie jar
+    :param auth_url: IDS 登录地址
+    :return: dump_cookies 格式的 cookie 列表
+    """
+
+    host = urlparse(auth_url).hostname
+    return [c for c in dump_cookies(jar) if c["domain"].lstrip(".") == host]
+
+
+class SSORegistry:
+    """
+    进程内的 IDS 单点登录注册表
+
+    以用户名为键保存 IDS 下发的 ticket-granting cookie（CASTGC 等），
+    同一用户访问其他服务时只需带着它请求一次 service= 跳转即可拿到 ticket
+    """
+
+    def __init__(self):
+        self._cookies: Dict[str, List[Dict[str, Any]]] = {}
+        self._locks: Dict[str, Lock] = {}
+        self._guard = Lock()
+
+    def get(self, username: str) -> Optional[List[Dict[str, Any]]]:
+        return self._cookies.get(username)
+
+    def set(self, username: str, cookies: List[Dict[str, Any]]):
+        self._cookies[username] = cookies
+
+    def discard(self, username: str):
+        self._cookies.pop(username, None)
+
+    def lock(self, username: str) -> Lock:
+        """同一用户的登录互斥，避免并发时重复完整登录"""
+
+        with self._guard:
+            return self._locks.setdefault(username, Lock())
+
+    def clear(self):
+        self._cookies.clear()
+
+
+sso_registry = SSORegistry()
+
+
 class IDSAuth(Auth):
     """统一身份验证"""
 
     AUTH_NAME = "IDS"
     AUTH_URL = "http://ids.xidian.edu.cn/authserver/login"
 
+    # 在此时间（秒）内保存的会话直接信任，不再发请求确认
+    SESSION_TRUST_TIME = 10 * 60
+
     def __init__(self, service_url: str):
         """
         初始化验证会话
 
+        会优先复用本地保存的会话，仅在会话失效时重新登录
+
         :param service_url: 需要使用 IDS 验证的服务 URL（应该可以认为是跳转来源？）
         """
 
         super().__init__()
 
-        # 获取登录必须的信息
-        params = {"service": service_url}
-        logger.debug(f"service_url:{service_url}")
-        resp = self.get(self.AUTH_URL, params=params)
+        self.service_url = service_url
+        logger.debug("service_url:{}", service_url)
+
+        saved = self.restore_session(service_url)
+        if saved is not None:
+            if saved.age < self.SESSION_TRUST_TIME or self.is_session_alive():
+                return
+            logger.debug("保存的会话已失效，重新登录")
+            self.cookies.clear()
+
+        self.login_service()
+
+    def login_service(self):
+        """优先通过单点登录，否则完整登录，取得当前服务的会话并保存"""
+
+        with sso_registry.lock(self.username):
+            if not self.login_with_ticket():
+                self.cookies.clear()
+                self.login()
+                sso_registry.set(
+                    self.username, ticket_granting_cookies(self.cookies, self.AUTH_URL)
+                )
+                self.persist_session()  # 空作用域用于保存单点登录凭据，供下次运行的其他服务使用
 
-        html = Selector(resp.text)
-        hidden_tags = html.css(".loginFromClass input[type=hidden]")
+        self.persist_session(self.service_url)
 
-        data = {
-            tag.attrib["name"]: tag.attrib.get("value")
-            for tag in hidden_tags
-            if "name" in tag.attrib
-        }
-        data.update({"username": self.username, "password": self.password})
+    def keep_alive(self):
+        if self.is_session_alive():
+            # 更新保存时间，之后的命令行调用在信任期内可直接使用
+            self.persist_session(self.service_url)
+            return
 
-        logger.debug(data)
+        logger.debug("{} 的会话已失效，重新登录", self.service_url)
+        self.cookies.clear()
+        self.login_service()
+
+    def login_with_ticket(self) -> bool:
+        """
+        使用已有的 ticket-granting cookie 登录当前服务
+
+        依次尝试进程内注册表与本地会话存储，有效时 IDS 会直接携带 ticket 跳回服务
+
+        :return: 是否登录成功
+        """
+
+        cookies = sso_registry.get(self.username)
+        if cookies is None:
+            saved = self.restore_session()
+            if saved is None:
+                return False
+            cookies = ticket_granting_cookies(self.cookies, self.AUTH_URL)
+        else:
+            load_cookies(self.cookies, cookies)
+
+        resp = self.get(self.AUTH_URL, params={"service": self.service_url})
+        if is_login_url(resp.url):
+            # 仍停留在登录页，ticket-granting cookie 已失效
+            logger.debug("IDS 单点登录凭据已失效")
+            sso_registry.discard(self.username)
+            return False
+
+        sso_registry.set(self.username, cookies)
+        logger.debug("通过单点登录获取 {} 的 ticket", self.service_url)
+        return True
+
+    def is_session_alive(self) -> bool:
+        """
+        检查当前会话是否仍然有效
+
+        未登录时服务会重定向至 IDS 登录页，因此只需看一眼重定向目标，不必跟随
+        """
+
+        resp = self.get(self.service_url, allow_redirects=False)
+        return not (resp.is_redirect and is_login_url(resp.headers.get("Location", "")))
+
+    def login(self):
+        """完整的登录流程"""
+
+        # 获取登录必须的信息
+        params = {"service": self.service_url}
+        resp = self.get(self.AUTH_URL, params=params)
 
-        key = html.css("input#pwdEncryptSalt").attrib["value"]
-        data["password"] = encrypt(key.encode(), str(data["password"]).encode())
+        data = login_form(resp.text, self.username, self.password)
 
         self.post(self.AUTH_URL, params=params, data=data)
-        self.get(service_url)
+        self.get(self.service_url)
@@ -0,0 +1,114 @@
+"""
+进程内共享的连接池
+
+所有 Auth 默认挂载同一个 adapter，不同用户、不同插件访问同一主机时复用已建立的连接。
+urllib3 的 PoolManager 会按主机划分连接池，cookie 仍保存在各自的 Session 中，互不影响。
+
+可在配置文件中调整:
+[NETWORK]
+POOL_CONNECTIONS = 8  # 缓存连接池的主机数
+POOL_MAXSIZE = 16  # 每个主机保留的连接数，并发较高时应不小于并发数
+KEEP_ALIVE = true  # 是否开启 TCP keepalive
+TIMEOUT = [5, 30]  # 连接超时与读取超时（秒），也可以是单个数字
+"""
+
+from typing import Dict, Optional, Tuple, Union
+import socket
+from threading import Lock
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from ohmyxdu.globals import get_config
+
+__all__ = ("SharedAdapter", "get_shared_adapter", "install_adapter", "get_timeout")
+
+DEFAULT_POOL_CONNECTIONS = 8
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_KEEP_ALIVE = True
+DEFAULT_TIMEOUT = (5, 30)
+
+_adapters: Dict[Tuple[int, int, bool], "SharedAdapter"] = {}
+_adapters_lock = Lock()
+_installed_adapter: Optional["SharedAdapter"] = None
+
+
+class SharedAdapter(HTTPAdapter):
+    """可被多个 Session 共享的 adapter，Session.close 不会关闭它"""
+
+    def __init__(self, keep_alive: bool = DEFAULT_KEEP_ALIVE, **kwargs):
+        self.keep_alive = keep_alive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keep_alive:
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+    def close(self):
+        # 连接池属于整个进程，单个 Session 关闭时保留
+        pass
+
+    def shutdown(self):
+        """真正关闭连接池"""
+
+        super().close()
+
+
+def _network_config() -> dict:
+    return get_config().get("NETWORK", {})
+
+
+def get_shared_adapter() -> SharedAdapter:
+    """
+    获取与当前配置对应的共享 adapter
+
+    :return: 同一配置在整个进程中只会创建一个 adapter
+    """
+
+    if _installed_adapter is not None:
+        return _installed_adapter
+
+    config = _network_config()
+    key = (
+        int(config.get("POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS)),
+        int(config.get("POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)),
+        bool(config.get("KEEP_ALIVE", DEFAULT_KEEP_ALIVE)),
+    )
+
+    adapter = _adapters.get(key)
+    if adapter is None:
+        with _adapters_lock:
+            adapter = _adapters.get(key)
+            if adapter is None:
+                adapter = SharedAdapter(
+                    pool_connections=key[0], pool_maxsize=key[1], keep_alive=key[2]
+                )
+                _adapters[key] = adapter
+    return adapter
+
+
+def install_adapter(adapter: Optional[SharedAdapter]):
+    """
+    让之后创建的所有 Auth 改用指定的 adapter，例如把请求转发到本地的测试服务器
+
+    :param adapter: 为 None 时恢复默认
+    """
+
+    global _installed_adapter
+    _installed_adapter = adapter
+
+
+def get_timeout() -> Union[float, Tuple[float, float]]:
+    """
+    当前配置的请求超时
+
+    :return: 单个数字或 (连接超时, 读取超时)
+    """
+
+    timeout = _network_config().get("TIMEOUT", DEFAULT_TIMEOUT)
+    if isinstance(timeout, (list, tuple)):
+        return tuple(timeout)
+    return timeout
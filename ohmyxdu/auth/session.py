@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+from json import dumps, loads
+from time import time
+from hashlib import blake2s
+from secrets import token_hex
+from pathlib import Path
+from http.cookiejar import Cookie, CookieJar
+
+from ohmyxdu.log import logger
+from ohmyxdu.globals import get_current_omx
+from ohmyxdu.security import encode_data, decode_data
+
+__all__ = ("SavedSession", "SessionStore", "get_session_store", "dump_cookies", "load_cookies")
+
+
+class SavedSession(NamedTuple):
+    saved_at: float
+    cookies: List[Dict[str, Any]]
+    data: Dict[str, Any]
+
+    @property
+    def age(self) -> float:
+        return time() - self.saved_at
+
+
+def dump_cookies(jar: CookieJar) -> List[Dict[str, Any]]:
+    """
+    将 cookie jar 转为可序列化的列表
+
+    :param jar: 任意 http.cookiejar.CookieJar（requests 的 cookie jar 也是它的子类）
+    :return:
+    """
+
+    return [
+        {
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "secure": cookie.secure,
+            "expires": cookie.expires,
+            "rest": cookie._rest,  # HttpOnly 等属性没有公开接口
+        }
+        for cookie in jar
+    ]
+
+
+def load_cookies(jar: CookieJar, cookies: List[Dict[str, Any]]):
+    """
+    将 dump_cookies 的结果写回 cookie jar，已过期的 cookie 会被丢弃
+
+    :param jar: 目标 cookie jar
+    :param cookies: dump_cookies 的结果
+    """
+
+    now = time()
+    for c in cookies:
+        if c["expires"] is not None and c["expires"] <= now:
+            continue
+        jar.set_cookie(
+            Cookie(
+                version=0,
+                name=c["name"],
+                value=c["value"],
+                port=None,
+                port_specified=False,
+                domain=c["domain"],
+                domain_specified=c["domain"].startswith("."),
+                domain_initial_dot=c["domain"].startswith("."),
+                path=c["path"],
+                path_specified=True,
+                secure=c["secure"],
+                expires=c["expires"],
+                discard=c["expires"] is None,
+                comment=None,
+                comment_url=None,
+                rest=c["rest"],
+            )
+        )
+
+
+class SessionStore:
+    """
+    加密的会话存储
+
+    每个 (验证名, 用户名, 作用域) 对应一个文件，内容由 ohmyxdu.security.encode_data 加密，
+    文件名为摘要，不会泄漏用户名
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _file(self, auth_name: str, username: str, scope: str) -> Path:
+        name = blake2s(f"{auth_name}\0{username}\0{scope}".encode(), digest_size=16).hexdigest()
+        return self.path / f"{name}.session"
+
+    def load(self, auth_name: str, username: str, scope: str = "") -> Optional[SavedSession]:
+        """
+        读取会话
+
+        :param auth_name: 验证名
+        :param username: 用户名
+        :param scope: 作用域，例如 IDS 的 service_url
+        :return: 不存在或无法解密时返回 None
+        """
+
+        session_file = self._file(auth_name, username, scope)
+        try:
+            plain = decode_data(session_file.read_bytes(), username)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # 换了机器或文件损坏
+            logger.debug("会话文件 {} 无法解密，已忽略", session_file)
+            return None
+
+        r = loads(plain)
+        return SavedSession(r["saved_at"], r["cookies"], r["data"])
+
+    def save(
+        self,
+        auth_name: str,
+        username: str,
+        scope: str,
+        cookies: CookieJar,
+        data: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        保存会话
+
+        :param auth_name: 验证名
+        :param username: 用户名
+        :param scope: 作用域
+        :param cookies: 当前会话的 cookie
+        :param data: 附带的其他信息，需能被 JSON 序列化
+        """
+
+        plain = dumps({"saved_at": time(), "cookies": dump_cookies(cookies), "data": data or {}})
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        session_file = self._file(auth_name, username, scope)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_file = session_file.with_suffix(f".{token_hex(4)}.tmp")
+        tmp_file.write_bytes(encode_data(plain.encode(), username))
+        tmp_file.replace(session_file)
+
+    def drop(self, auth_name: str, username: str, scope: str = ""):
+        """删除会话"""
+
+        try:
+            self._file(auth_name, username, scope).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    获取当前 OMX 对应的会话存储
+
+    :return: OMX 未指定数据目录（例如直接由 dict 构造）时返回 None
+    """
+
+    try:
+        data_path = get_current_omx().data_path
+    except LookupError:
+        return None
+
+    if data_path is None:
+        return None
+    return SessionStore(data_path / "sessions")
@@ -0,0 +1,100 @@
+"""
+常驻进程中复用已登录的验证会话
+
+安装 SessionCache 后，同一用户以相同参数构造的 Auth（例如插件中的 IDSAuth(SERVICE_URL)、WXAuth()）
+直接返回内存中已登录的实例，不再读取会话文件，也不再登录。
+会话可能在服务端过期，常驻进程应定期调用 SessionCache.refresh，由各 Auth 的 keep_alive 保持有效:
+install_session_cache(SessionCache())
+assert IDSAuth(SERVICE_URL) is IDSAuth(SERVICE_URL)
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional, Tuple
+from threading import Lock
+
+from ohmyxdu.log import logger
+from ohmyxdu.globals import get_config
+
+if TYPE_CHECKING:
+    from ohmyxdu.auth import Auth
+
+__all__ = ("SessionCache", "install_session_cache", "get_session_cache")
+
+_installed_cache: Optional["SessionCache"] = None
+
+
+class SessionCache:
+    """以 (验证类, 账号配置, 构造参数) 为键保存已登录的验证会话，可在多线程间共用"""
+
+    def __init__(self):
+        self._sessions: Dict[Hashable, "Auth"] = {}
+        self._locks: Dict[Hashable, Lock] = {}
+        self._guard = Lock()
+
+    @staticmethod
+    def _key(cls: type, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Hashable:
+        # 账号配置整体参与比较，修改了某个验证的账号密码后不会取到旧会话
+        credentials = repr(get_config().get("CREDENTIALS"))
+        return cls, credentials, args, tuple(sorted(kwargs.items()))
+
+    def get(
+        self,
+        cls: type,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        create: Callable[[], "Auth"],
+    ) -> "Auth":
+        """
+        取出已有的会话，没有时调用 create 构造，同一键的并发构造只会执行一次
+
+        :param cls: 验证类
+        :param args: 构造参数
+        :param kwargs: 构造参数
+        :param create: 真正的构造函数
+        """
+
+        key = self._key(cls, args, kwargs)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._guard:
+            lock = self._locks.setdefault(key, Lock())
+        with lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = create()
+                self._sessions[key] = session
+        return session
+
+    def refresh(self):
+        """对所有会话调用 keep_alive，失败的会话会被丢弃，下次使用时重新构造"""
+
+        for key, session in list(self._sessions.items()):
+            try:
+                session.keep_alive()
+            except Exception as e:
+                logger.debug("{} 的会话刷新失败，已丢弃: {!r}", session.AUTH_NAME, e)
+                self._sessions.pop(key, None)
+
+    def clear(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def install_session_cache(cache: Optional[SessionCache]):
+    """
+    让之后构造的所有 Auth 从指定的缓存中取出
+
+    :param cache: 为 None 时恢复每次构造新会话
+    """
+
+    global _installed_cache
+    _installed_cache = cache
+
+
+def get_session_cache() -> Optional[SessionCache]:
+    return _installed_cache
@@ -1,39 +1,169 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from json import dumps
 from hashlib import md5
+from threading import Lock
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 
-from loguru import logger
+from requests import Response
 
+from ohmyxdu.log import logger
 from ohmyxdu.auth import Auth
 from ohmyxdu.utils import timestamp
 
+__all__ = ("WXAuth",)
+
+APP_KEY = "GiITvn"
+
+# post_many 同时在途的请求数
+DEFAULT_WORKERS = 4
+
 
 class WXAuth(Auth):
     AUTH_NAME = "WX"
     AUTH_URL = "http://202.117.121.7:8080"
 
+    LOGIN_URL = AUTH_URL + "/baseCampus/login/login.do"
+
     def __init__(self):
+        """
+        初始化验证会话
+
+        会优先使用本地保存的 token，token 失效时在第一次请求被拒绝后自动重新登录
+        """
+
         super().__init__()
+        self._login_lock = Lock()
+
+        saved = self.restore_session()
+        token = saved.data.get("token") if saved is not None else None
+        if token:
+            logger.debug("使用保存于 {:.0f} 秒前的 token", saved.age)
+            self.headers["token"] = token
+            return
+
+        self.login()
+
+    def login(self):
+        """登录并保存 token"""
 
-        data = {"userName": self.username, "password": self.password, "schoolId": 190}
-        data["password"] = str(data["password"])
-        resp = self.post(self.AUTH_URL + "/baseCampus/login/login.do", data=data)
+        data = {"userName": self.username, "password": str(self.password), "schoolId": 190}
+        # 登录请求本身不需要失效重试
+        resp = super().post(self.LOGIN_URL, json=self.signed_payload(data))
+
+        token = self.parse_token(resp.json())
+        self.headers["token"] = token
+        self.persist_session(data={"token": token})
+
+    def relogin(self, stale_token: Optional[str]):
+        """
+        token 被拒绝后重新登录，并发的请求同时发现失效时只登录一次
+
+        :param stale_token: 被拒绝的请求所携带的 token
+        """
+
+        with self._login_lock:
+            if self.headers.get("token") != stale_token:
+                return  # 其他线程已重新登录
+            logger.debug("token 已失效，重新登录")
+            self.login()
+
+    @staticmethod
+    def parse_token(data: Dict[str, Any]) -> str:
+        """
+        从登录结果中取出 token
+
+        :param data: 登录接口返回的 JSON
+        :return: 需放入请求头的 token
+        """
 
-        data = resp.json()
         if data["isConfirm"] != 1:
             raise PermissionError("登录失败")
 
-        self.headers["token"] = "_".join(data["token"])
         logger.debug("token:{}", data["token"])
+        return "_".join(data["token"])
+
+    @staticmethod
+    def is_token_expired(data: Any) -> bool:
+        """
+        接口是否因 token 失效而拒绝了请求
+
+        :param data: 接口返回的 JSON
+        >>> WXAuth.is_token_expired({'msgState': -1, 'msg': '登录已失效，请重新登录'})
+        True
+        >>> WXAuth.is_token_expired({'msgState': 0})
+        False
+        """
+
+        return (
+            isinstance(data, dict) and data.get("msgState") == -1 and "登录" in data.get("msg", "")
+        )
 
     @staticmethod
     def sign_data(data: Dict):
         s = "&".join(f"{key}={value}" for key, value in data.items())
         return md5(s.encode()).hexdigest()
 
-    def post(self, url: str, data: Optional[Dict[str, Any]] = None, **kwargs):
-        if data is None:
-            data = {}
-        json = {"appKey": "GiITvn", "param": dumps(data), "secure": 0, "time": timestamp()}
-        json["sign"] = self.sign_data(json)
-        return super().post(url, json=json, **kwargs)
+    @classmethod
+    def signed_payload(cls, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        将请求参数包装为带签名的请求体
+
+        字段顺序固定，签名串直接拼接，与 sign_data 对整个请求体签名的结果相同
+
+        :param data: 请求参数
+        :return: 可直接作为 JSON 发送的请求体
+        """
+
+        param = dumps(data) if data else "{}"
+        time = timestamp()
+        sign = md5(f"appKey={APP_KEY}&param={param}&secure=0&time={time}".encode()).hexdigest()
+        return {"appKey": APP_KEY, "param": param, "secure": 0, "time": time, "sign": sign}
+
+    def post(self, url: str, data: Optional[Dict[str, Any]] = None, **kwargs) -> Response:
+        """
+        发送签名请求，token 失效时重新登录并重试一次
+
+        :param url: 接口 URL
+        :param data: 请求参数
+        """
+
+        token = self.headers.get("token")
+        resp = super().post(url, json=self.signed_payload(data), **kwargs)
+
+        try:
+            expired = self.is_token_expired(resp.json())
+        except ValueError:
+            return resp
+        if not expired:
+            return resp
+
+        self.relogin(token)
+        # 重新签名，time 需要更新
+        return super().post(url, json=self.signed_payload(data), **kwargs)
+
+    def post_many(
+        self,
+        calls: Iterable[Tuple[str, Optional[Dict[str, Any]]]],
+        *,
+        workers: int = DEFAULT_WORKERS,
+    ) -> List[Response]:
+        """
+        在同一个已登录的会话上并发发送多个签名请求
+
+        token 失效时所有请求共用一次重新登录，适合定时查询余额、借书记录等多个接口的场景
+
+        :param calls: [(接口 URL, 请求参数), ...]
+        :param workers: 同时在途的请求数
+        :return: 按传入顺序排列的响应
+        """
+
+        calls = list(calls)
+        if len(calls) <= 1:
+            return [self.post(url, data) for url, data in calls]
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(calls))) as executor:
+            futures = [
+                executor.submit(copy_context().run, self.post, url, data) for url, data in calls
+            ]
+            return [future.result() for future in futures]
@@ -1,31 +1,59 @@
-from loguru import logger
-from parsel import Selector
-
+from ohmyxdu.log import logger
 from ohmyxdu.auth import Auth
+from ohmyxdu.utils.data_structure import Secret
+
+
+def login_form(html_text: str, username: str, password: Secret) -> dict:
+    """
+    由登录页构造登录表单
+
+    :param html_text: 自服务登录页
+    :param username: 用户名
+    :param password: 明文密码
+    :return: 可直接 POST 的表单
+    """
+
+    from parsel import Selector
+
+    html = Selector(html_text)
+    hidden_tags = html.css("input[type=hidden]")
+
+    hidden = {tag.attrib["name"]: tag.attrib["value"] for tag in hidden_tags}
+    # 在填入账号密码之前记录，密码不应出现在日志中
+    logger.debug("登录表单: {}", hidden)
+
+    data = {"LoginForm[username]": username, "LoginForm[password]": password}
+    data.update(hidden)
+
+    data["LoginForm[password]"] = str(data["LoginForm[password]"])
+    return data
 
 
 class ZFWAuth(Auth):
     AUTH_NAME = "ZFW"
     AUTH_URL = "https://zfw.xidian.edu.cn"
 
+    HOME_URL = AUTH_URL + "/home"
+
     def __init__(self):
         super().__init__()
+        self.login()
 
+    def login(self):
         # 绕过验证码
         self.headers["User-Agent"] = "Mobile"
 
         resp = self.get(self.AUTH_URL)
-
-        html = Selector(resp.text)
-        hidden_tags = html.css("input[type=hidden]")
-
-        data = {"LoginForm[username]": self.username, "LoginForm[password]": self.password}
-        data.update({tag.attrib["name"]: tag.attrib["value"] for tag in hidden_tags})
-
-        logger.debug(data)
-
-        data["LoginForm[password]"] = str(data["LoginForm[password]"])
+        data = login_form(resp.text, self.username, self.password)
 
         self.post(self.AUTH_URL, data=data)
 
         del self.headers["User-Agent"]
+
+    def keep_alive(self):
+        # 未登录时首页会跳转回登录页
+        resp = self.get(self.HOME_URL, allow_redirects=False)
+        if resp.is_redirect:
+            logger.debug("自服务会话已失效，重新登录")
+            self.cookies.clear()
+            self.login()
@@ -0,0 +1,180 @@
+"""
+批量执行插件
+
+多用户：每个用户在独立的 contextvars 上下文中构造自己的 OMX 对象，互不干扰:
+users = load_users(Path("users.toml"))
+for r in run_batch(get_grade, users, workers=8, year_semester="2019-2020-1"):
+    print(r.username, r.error or r.result)
+
+多插件：同一用户并发执行多个插件，各验证只登录一次，由所有插件共用:
+for r in run_plugins({"get_grade": get_grade, "get_card_balance": get_card_balance}):
+    print(r.name, r.error or r.result)
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from pathlib import Path
+from time import perf_counter
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from toml import loads
+
+from ohmyxdu.globals import get_config, set_current_plugin
+
+__all__ = ("BatchResult", "PluginResult", "load_users", "run_batch", "run_plugins")
+
+
+class BatchResult(NamedTuple):
+    username: str
+    result: Any
+    error: Optional[BaseException]
+
+
+class PluginResult(NamedTuple):
+    name: str
+    result: Any
+    error: Optional[BaseException]
+    elapsed: float  # 秒
+
+
+def load_users(users_path: Path) -> List[Dict[str, Any]]:
+    """
+    读取用户列表
+
+    文件格式与配置文件中的 CREDENTIALS 相同，每个用户一项，密码同样需由 ohmyxdu.security.encode_password 加密:
+    [[USERS]]
+    USERNAME = "student_id"
+    PASSWORD = "..."
+
+    [USERS.ZFW]
+    USERNAME = "student_id"
+
+    :param users_path: 用户列表文件路径
+    :return: 每个用户的 CREDENTIALS
+    """
+
+    users = loads(users_path.read_text()).get("USERS", [])
+    for i, credentials in enumerate(users):
+        if not credentials.get("USERNAME") or not credentials.get("PASSWORD"):
+            raise ValueError(f"第 {i + 1} 个用户缺少 USERNAME 或 PASSWORD")
+    return users
+
+
+def _run_one(
+    plugin: Callable[..., Any],
+    credentials: Dict[str, Any],
+    data_path: Optional[Path],
+    kwargs: Dict[str, Any],
+) -> Any:
+    from ohmyxdu import OMX
+
+    try:
+        # 网络、缓存等配置沿用调用方的，只替换账号
+        config = dict(get_config(), CREDENTIALS=credentials)
+    except LookupError:
+        config = {"CREDENTIALS": credentials}
+
+    omx = OMX(config)
+    omx.data_path = data_path
+    set_current_plugin(getattr(plugin, "__name__", None))
+    return plugin(**kwargs)
+
+
+def run_batch(
+    plugin: Callable[..., Any],
+    users: Iterable[Dict[str, Any]],
+    *,
+    workers: int = 4,
+    data_path: Optional[Path] = None,
+    **kwargs,
+) -> Iterator[BatchResult]:
+    """
+    为多个用户并发执行插件，结果按完成顺序产出
+
+    :param plugin: 插件函数
+    :param users: 每个用户的 CREDENTIALS，可由 load_users 读取
+    :param workers: 并发数
+    :param data_path: 会话等本地数据的存放目录，为空时不做持久化
+    :param kwargs: 传给插件的参数
+    :return: 每个用户的执行结果，插件抛出的异常会被记录在 error 中
+    """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            # 每个用户一份上下文副本，OMX 构造时会替换其中的配置，用户间互相隔离，
+            # 同时保留 --refresh 等调用方设置的状态
+            executor.submit(copy_context().run, _run_one, plugin, credentials, data_path, kwargs): (
+                credentials["USERNAME"]
+            )
+            for credentials in users
+        }
+
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                yield BatchResult(futures[future], None if error else future.result(), error)
+        finally:
+            # 调用方提前停止迭代时不再执行排队中的用户
+            for future in futures:
+                future.cancel()
+
+
+def _call_plugin(name: str, plugin: Callable[..., Any], kwargs: Dict[str, Any]) -> PluginResult:
+    set_current_plugin(name)
+    started = perf_counter()
+    try:
+        result = plugin(**kwargs)
+    except Exception as e:
+        return PluginResult(name, None, e, perf_counter() - started)
+    return PluginResult(name, result, None, perf_counter() - started)
+
+
+def run_plugins(
+    plugins: Dict[str, Callable[..., Any]],
+    *,
+    workers: Optional[int] = None,
+    kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Iterator[PluginResult]:
+    """
+    为当前用户并发执行多个插件，结果按完成顺序产出
+
+    执行期间安装 ohmyxdu.auth.warm.SessionCache，插件构造的同一种验证会话只登录一次，
+    不同的验证（IDS、WX、ZFW 等）在各自的插件线程中同时登录
+
+    :param plugins: 插件名到插件函数
+    :param workers: 并发数，默认每个插件一个线程
+    :param kwargs: 插件名到传给该插件的参数
+    :return: 每个插件的执行结果，插件抛出的异常会被记录在 error 中
+    """
+
+    from ohmyxdu.auth.warm import SessionCache, get_session_cache, install_session_cache
+
+    if not plugins:
+        return
+    if kwargs is None:
+        kwargs = {}
+
+    # 已在常驻进程等已有缓存的环境中时直接沿用
+    cache = None
+    if get_session_cache() is None:
+        cache = SessionCache()
+        install_session_cache(cache)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or len(plugins)) as executor:
+            futures = [
+                executor.submit(
+                    copy_context().run, _call_plugin, name, plugin, kwargs.get(name, {})
+                )
+                for name, plugin in plugins.items()
+            ]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        if cache is not None:
+            install_session_cache(None)
+            cache.clear()
@@ -0,0 +1,84 @@
+from typing import Any, Callable, Dict, List, Union, get_type_hints
+from pathlib import Path
+
+from toml import loads
+
+from ohmyxdu.globals import get_current_omx
+from ohmyxdu.log import logger
+
+
+def parse_option(option: str) -> tuple:
+    """
+    解析形如 key=value 的插件参数，value 按 toml 字面量解析，失败时作为字符串
+
+    >>> parse_option('limit=5')
+    ('limit', 5)
+    >>> parse_option('year-semester=2019-2020-1')
+    ('year_semester', '2019-2020-1')
+    """
+
+    key, _, value = option.partition("=")
+    try:
+        value = loads(f"value = {value}")["value"]
+    except ValueError:
+        pass
+    return key.strip().replace("-", "_"), value
+
+
+def coerce_options(func: Callable[..., Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按插件参数的注解转换 parse_option 得到的值，例如把字符串转为 Path
+
+    >>> def f(*, save_path: Path = None, limit: int = 0): ...
+    >>> coerce_options(f, {'save_path': 'out', 'limit': 5}) == {'save_path': Path('out'), 'limit': 5}
+    True
+    """
+
+    hints = get_type_hints(func)
+    r = {}
+    for key, value in kwargs.items():
+        hint = hints.get(key)
+        # Optional[X] 即 Union[X, None]
+        if getattr(hint, "__origin__", None) is Union:
+            hint = next((a for a in hint.__args__ if a is not type(None)), None)
+        if isinstance(hint, type) and hint is not Any and not isinstance(value, hint):
+            value = hint(value)
+        r[key] = value
+    return r
+
+
+def batch(plugin: str, *, users: Path, workers: int = 4, option: List[str] = ()):
+    """
+    为多个用户批量执行插件，结果按完成顺序输出
+
+    :param plugin: 插件名称，例如 get-grade
+    :param users: 用户列表文件（toml），每个用户一项 [[USERS]]，格式与配置文件中的 CREDENTIALS 相同
+    :param workers: 并发数
+    :param option: 传给插件的参数，形如 year-semester=2019-2020-1，可指定多个
+    """
+
+    from ohmyxdu.batch import load_users, run_batch
+    from ohmyxdu.output import muted_output
+
+    app = get_current_omx()
+
+    try:
+        plugin_func = app.load_plugin(plugin.replace("-", "_"))
+    except KeyError:
+        raise ValueError(f"插件 {plugin} 不存在，可使用 omx show 查看可用插件")
+
+    kwargs = coerce_options(plugin_func, dict(parse_option(o) for o in option))
+
+    # 指定了 --format 时每个用户输出一条结果，插件自身的结果会与其他用户的混在一起，不再输出
+    with muted_output() as output:
+        for r in run_batch(
+            plugin_func, load_users(users), workers=workers, data_path=app.data_path, **kwargs
+        ):
+            if r.error is not None:
+                logger.opt(exception=r.error).error("[{}] 执行失败", r.username)
+            elif output is None:
+                logger.success("[{}] {!r}", r.username, r.result)
+
+            if output is not None:
+                error = None if r.error is None else f"{type(r.error).__name__}: {r.error}"
+                output.write(({"username": r.username, "result": r.result, "error": error},))
@@ -0,0 +1,52 @@
+from typing import Any, Dict, List, Optional
+from json import dumps
+from pathlib import Path
+
+from ohmyxdu.globals import get_current_omx
+
+
+def _path_options(name: str, kwargs: Dict[str, Any]) -> List[str]:
+    """
+    找出 kwargs 中注解为 Path 的参数
+
+    优先使用插件清单中的注解，Python 3.8 之前清单中没有注解，只能导入插件
+
+    :param name: 插件名，例如 export_class_schedule
+    :param kwargs: parse_option 得到的参数
+    :return: 参数名
+    """
+
+    from ohmyxdu.builtins.batch import coerce_options
+
+    app = get_current_omx()
+    info = app.manifest.get(name)
+    if info is None:
+        return []  # 由常驻进程报错
+
+    annotations = {p["name"]: p["annotation"] for p in info.params}
+    if any(annotations.get(key) is None for key in kwargs if key in annotations):
+        coerced = coerce_options(app.load_plugin(name), kwargs)
+        return [key for key, value in coerced.items() if isinstance(value, Path)]
+    return [key for key in kwargs if "Path" in annotations.get(key, "")]
+
+
+def call(plugin: str, *, option: List[str] = (), socket: Optional[Path] = None):
+    """
+    在 omx serve 启动的常驻进程中执行插件，结果以 JSON 输出
+
+    :param plugin: 插件名称，例如 get-card-balance
+    :param option: 传给插件的参数，形如 year-semester=2019-2020-1，可指定多个
+    :param socket: 常驻进程的 Unix socket，默认为数据目录下的 omx.sock
+    """
+
+    from ohmyxdu.builtins.batch import parse_option
+    from ohmyxdu.daemon import SOCKET_FILE, call as daemon_call
+
+    if socket is None:
+        socket = (get_current_omx().data_path or Path()) / SOCKET_FILE
+
+    kwargs = dict(parse_option(o) for o in option)
+    # 常驻进程的工作目录与当前不同，相对路径需在此转为绝对路径
+    for key in _path_options(plugin.replace("-", "_"), kwargs):
+        kwargs[key] = str(Path(kwargs[key]).absolute())
+    print(dumps(daemon_call(plugin, socket, kwargs), ensure_ascii=False))
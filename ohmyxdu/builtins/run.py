@@ -0,0 +1,90 @@
+from typing import Any, Dict, List
+
+from ohmyxdu.globals import get_current_omx
+from ohmyxdu.log import logger
+
+
+def split_options(options: List[str], plugins: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    将 --option 分配给各插件，带 插件名: 前缀的只给该插件，否则给所有有该参数的插件
+
+    :param options: 形如 get-grade:year-semester=2019-2020-1 或 limit=5
+    :param plugins: 插件名，下划线形式
+    :return: 插件名到参数
+    """
+
+    from ohmyxdu.builtins.batch import parse_option
+
+    manifest = get_current_omx().manifest
+    r: Dict[str, Dict[str, Any]] = {name: {} for name in plugins}
+    for option in options:
+        target, sep, rest = option.partition(":")
+        if sep and "=" not in target:
+            name = target.replace("-", "_")
+            if name not in r:
+                raise ValueError(f"参数 {option} 指定的插件 {target} 不在本次执行的插件中")
+            key, value = parse_option(rest)
+            r[name][key] = value
+            continue
+
+        key, value = parse_option(option)
+        targets = [n for n in plugins if any(p["name"] == key for p in manifest[n].params)]
+        if not targets:
+            raise ValueError(f"没有插件接受参数 {key}")
+        for name in targets:
+            r[name][key] = value
+    return r
+
+
+def run(*plugins: str, option: List[str] = (), workers: int = 0):
+    """
+    同时执行多个插件，各验证只登录一次，最后汇总各插件的结果
+
+    :param plugins: 插件名称，例如 get-grade get-card-balance
+    :param option: 传给插件的参数，形如 year-semester=2019-2020-1（给所有有该参数的插件）
+                   或 get-grade:year-semester=2019-2020-1（只给指定插件），可指定多个
+    :param workers: 并发数，默认每个插件一个线程
+    """
+
+    from ohmyxdu.batch import run_plugins
+    from ohmyxdu.output import muted_output
+
+    if not plugins:
+        raise ValueError("至少需要指定一个插件，可使用 omx show 查看可用插件")
+
+    app = get_current_omx()
+
+    names = []
+    for plugin in plugins:
+        name = plugin.replace("-", "_")
+        info = app.manifest.get(name)
+        if info is None or info.module.startswith("ohmyxdu.builtins."):
+            raise ValueError(f"插件 {plugin} 不存在，可使用 omx show 查看可用插件")
+        if name not in names:
+            names.append(name)
+
+    from ohmyxdu.builtins.batch import coerce_options
+
+    funcs = {name: app.load_plugin(name) for name in names}
+    kwargs = {
+        name: coerce_options(funcs[name], options)
+        for name, options in split_options(list(option), names).items()
+    }
+
+    failed = 0
+    # 指定了 --format 时每个插件输出一条结果，各插件的结果字段不同，不再逐条输出
+    with muted_output() as output:
+        for r in run_plugins(funcs, workers=workers or None, kwargs=kwargs):
+            if r.error is not None:
+                failed += 1
+                logger.opt(exception=r.error).error("[{}] 执行失败", r.name)
+            else:
+                logger.debug("[{}] 完成，耗时 {:.0f} ms", r.name, r.elapsed * 1000)
+
+            if output is not None:
+                error = None if r.error is None else f"{type(r.error).__name__}: {r.error}"
+                output.write(
+                    ({"plugin": r.name, "result": r.result, "error": error, "elapsed": r.elapsed},)
+                )
+
+    logger.info("共 {} 个插件，{} 个成功，{} 个失败", len(names), len(names) - failed, failed)
@@ -0,0 +1,21 @@
+from typing import Optional
+from pathlib import Path
+
+from ohmyxdu.globals import get_current_omx
+
+
+def serve(*, socket: Optional[Path] = None, refresh_interval: int = 300):
+    """
+    启动常驻进程，之后可通过 omx call 快速执行插件
+
+    :param socket: 监听的 Unix socket，默认为数据目录下的 omx.sock
+    :param refresh_interval: 后台刷新登录会话的间隔（秒），0 为不刷新
+    """
+
+    from ohmyxdu.daemon import SOCKET_FILE, Daemon
+
+    app = get_current_omx()
+    if socket is None:
+        socket = (app.data_path or Path()) / SOCKET_FILE
+
+    Daemon(app, socket, refresh_interval).serve_forever()
@@ -1,15 +1,23 @@
-from defopt import _create_parser
-
 from ohmyxdu.globals import get_current_omx
 
 
-def show():
-    """显示当前可用的插件"""
+def show(*, detail: bool = False):
+    """
+    显示当前可用的插件
+
+    :param detail: 同时显示插件参数
+    """
 
-    app = get_current_omx()
+    manifest = get_current_omx().manifest
 
-    min_width = max(len(f.__name__) for f in app.plugins) + 1
+    min_width = max(len(info.command) for info in manifest.values()) + 1
     print("插件名称".ljust(min_width), "插件介绍")
-    for plugin in app.plugins:
-        parsed = _create_parser(plugin)  # TODO: 性能提升
-        print(plugin.__name__.replace("_", "-").ljust(min_width), parsed.description)
+    for info in manifest.values():
+        print(info.command.ljust(min_width), info.brief)
+        if not detail:
+            continue
+        for param in info.params:
+            name = param["name"].replace("_", "-")
+            if param["kind"] == "keyword":
+                name = f"--{name}"
+            print(" " * min_width, f"  {name}".ljust(min_width), param["doc"])
@@ -0,0 +1,309 @@
+"""
+插件结果缓存
+
+成绩、课程表、流量这类数据很少变化，缓存命中时连登录都不需要。
+缓存保存在配置文件旁的 cache.sqlite3 中，按 (名称, 参数, 用户) 区分，内容与会话一样加密存储。
+
+可在配置文件中调整:
+[CACHE]
+ENABLED = true
+MAX_SIZE = 16  # MiB，超出后按最近访问时间淘汰
+
+[CACHE.TTL]  # 秒，0 为不缓存，未指定时使用插件的默认值
+get_grade = 600
+get_network_usage = 300
+
+命令行中可使用 omx --refresh <插件> 跳过缓存重新获取，获取到的结果仍会写入缓存。
+"""
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Iterator,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+import pickle
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from hashlib import blake2s
+from pathlib import Path
+from threading import local
+from time import time
+
+from ohmyxdu.log import logger
+from ohmyxdu.globals import get_config, get_current_omx
+from ohmyxdu.security import encode_data, decode_data
+
+if TYPE_CHECKING:
+    from ohmyxdu.auth import BaseAuth
+
+__all__ = ("ResultCache", "get_result_cache", "result_cache", "cached_call", "refresh_cache")
+
+CACHE_FILE = "cache.sqlite3"
+DEFAULT_MAX_SIZE = 16  # MiB
+
+F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
+
+_refresh = ContextVar("cache_refresh", default=False)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    username TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+class ResultCache:
+    """
+    基于 sqlite 的结果缓存，可在多线程、多进程间共用
+
+    :param path: 数据库路径
+    :param max_size: 缓存内容总大小上限（字节）
+    """
+
+    def __init__(self, path: Path, max_size: int = DEFAULT_MAX_SIZE << 20):
+        self.path = path
+        self.max_size = max_size
+        self._local = local()
+
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite 的连接不能跨线程使用，每个线程各开一个
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str, username: str) -> Tuple[bool, Any]:
+        """
+        :param key: 缓存键
+        :param username: 写入时的用户名，用于解密
+        :return: (是否命中, 缓存的值)
+        """
+
+        now = time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM results WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return False, None
+            db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            return True, pickle.loads(decode_data(row[0], username))
+        except Exception:  # 换了机器或数据损坏，当作未命中
+            logger.debug("缓存 {} 无法读取，已丢弃", key)
+            self.delete(key)
+            return False, None
+
+    def set(self, key: str, name: str, username: str, value: Any, ttl: float):
+        """
+        写入缓存，并在超出大小上限时淘汰最久未访问的内容
+
+        :param key: 缓存键
+        :param name: 缓存名称，一般为插件名，可按名称清除
+        :param username: 用户名，同时用作加密密钥
+        :param value: 可被 pickle 的值
+        :param ttl: 有效期（秒）
+        """
+
+        blob = encode_data(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), username)
+        now = time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, name, username, blob, len(blob), now + ttl, now),
+            )
+            self._evict(db, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total <= self.max_size:
+            return
+
+        freed = 0
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            if total - freed <= self.max_size:
+                break
+            victims.append((key,))
+            freed += size
+        db.executemany("DELETE FROM results WHERE key = ?", victims)
+        logger.debug("缓存超出大小上限，淘汰了 {} 项", len(victims))
+
+    def delete(self, key: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def clear(self, name: Optional[str] = None, username: Optional[str] = None):
+        """
+        清除缓存
+
+        :param name: 只清除该名称的缓存
+        :param username: 只清除该用户的缓存
+        """
+
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM results WHERE (? IS NULL OR name = ?) AND (? IS NULL OR username = ?)",
+                (name, name, username, username),
+            )
+
+
+@lru_cache(maxsize=None)
+def _open(path: Path, max_size: int) -> ResultCache:
+    return ResultCache(path, max_size)
+
+
+def _cache_config() -> dict:
+    return get_config().get("CACHE", {})
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    获取当前 OMX 对应的结果缓存
+
+    :return: OMX 未指定数据目录或配置中关闭了缓存时返回 None
+    """
+
+    try:
+        data_path = get_current_omx().data_path
+    except LookupError:
+        return None
+
+    config = _cache_config()
+    if data_path is None or not config.get("ENABLED", True):
+        return None
+    return _open(data_path / CACHE_FILE, int(config.get("MAX_SIZE", DEFAULT_MAX_SIZE) * (1 << 20)))
+
+
+@contextmanager
+def refresh_cache() -> Iterator[None]:
+    """with 块内跳过所有缓存，重新获取的结果仍会写入缓存"""
+
+    token = _refresh.set(True)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+def _check_auth(per_user: bool, auth: Optional[Type["BaseAuth"]]):
+    if per_user and auth is None:
+        raise ValueError("结果因用户而异时需指定 auth，以区分使用不同账号的用户")
+
+
+def cached_call(
+    name: str,
+    ttl: float,
+    key: tuple,
+    func: Callable[[], T],
+    *,
+    auth: Optional[Type["BaseAuth"]] = None,
+    per_user: bool = True,
+    lock: Optional[ContextManager] = None,
+) -> T:
+    """
+    result_cache 的函数形式，用于参数中有令牌等不应参与缓存键的对象的情况
+
+    :param name: 缓存名称，用于在 [CACHE.TTL] 中单独配置有效期
+    :param ttl: 默认有效期（秒）
+    :param key: 决定结果的全部参数，需能稳定地 repr
+    :param func: 未命中时调用
+    :param auth: func 中使用的验证类，缓存按该验证实际使用的账号区分用户
+    :param per_user: 结果是否因用户而异，为 False 时所有用户共用，不需要 auth
+    :param lock: 未命中时持有该锁再查一次缓存，仍未命中才调用 func，使并发的未命中只请求一次
+    """
+
+    _check_auth(per_user, auth)
+
+    cache = get_result_cache()
+    seconds = _cache_config().get("TTL", {}).get(name, ttl)
+    if cache is None or seconds <= 0:
+        return func()
+
+    username = auth.resolve_username() if per_user else ""
+    digest = blake2s(repr((*key, username)).encode()).hexdigest()
+
+    def lookup() -> Tuple[bool, Any]:
+        if _refresh.get():
+            return False, None
+        hit, value = cache.get(digest, username)
+        if hit:
+            logger.debug("{} 命中缓存", name)
+        return hit, value
+
+    hit, value = lookup()
+    if hit:
+        return value
+    if lock is None:
+        value = func()
+        cache.set(digest, name, username, value, seconds)
+        return value
+
+    with lock:
+        # 等锁期间其他线程可能已写入缓存
+        hit, value = lookup()
+        if not hit:
+            value = func()
+            cache.set(digest, name, username, value, seconds)
+    return value
+
+
+def result_cache(
+    name: str, ttl: float, *, auth: Optional[Type["BaseAuth"]] = None, per_user: bool = True
+) -> Callable[[F], F]:
+    """
+    缓存函数的返回值
+
+    函数需只通过参数与当前配置决定结果，返回值需能被 pickle
+    >>> from ohmyxdu.auth import BaseAuth
+    >>> @result_cache('get_grade', ttl=600, auth=BaseAuth)
+    ... def fetch_grades(year_semester=None): ...
+
+    :param name: 缓存名称，用于在 [CACHE.TTL] 中单独配置有效期
+    :param ttl: 默认有效期（秒）
+    :param auth: 函数中使用的验证类，缓存按该验证实际使用的账号区分用户
+    :param per_user: 结果是否因用户而异，为 False 时所有用户共用，不需要 auth
+    """
+
+    _check_auth(per_user, auth)
+
+    def decorator(func: F) -> F:
+        qualified_name = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return cached_call(
+                name,
+                ttl,
+                (qualified_name, args, sorted(kwargs.items())),
+                lambda: func(*args, **kwargs),
+                auth=auth,
+                per_user=per_user,
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,26 +1,94 @@
+from typing import Dict, List, Optional, Tuple
 from os import environ
+from sys import argv
 from pathlib import Path
+from contextlib import ExitStack
 
-from loguru import logger
+from ohmyxdu.log import configure_logging
 
-from ohmyxdu import OMX
+from ohmyxdu import OMX, __version__
 
 debug = bool(environ.get("DEBUG"))
 
+# 全局选项，需写在插件名之前，例如 omx --metrics metrics.prom get-grade
+# 选项名: 是否带参数
+GLOBAL_OPTIONS = {"--metrics": True, "--profile": False, "--refresh": False, "--format": True}
+
+
+def split_global_options(args: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    从命令行参数开头取出全局选项
+
+    :param args: 命令行参数
+    :return: 全局选项与剩余的参数
+    >>> split_global_options(['--metrics', 'm.prom', 'get-grade', '-h'])
+    ({'--metrics': 'm.prom'}, ['get-grade', '-h'])
+    >>> split_global_options(['--profile', '--metrics=m.json', 'show'])
+    ({'--profile': None, '--metrics': 'm.json'}, ['show'])
+    """
+
+    options: Dict[str, Optional[str]] = {}
+
+    i = 0
+    while i < len(args):
+        name, has_value, value = args[i].partition("=")
+        if name not in GLOBAL_OPTIONS:
+            break
+        if GLOBAL_OPTIONS[name] and not has_value:
+            if i + 1 == len(args):
+                break  # 缺少参数，留给 index_parser 报错
+            i += 1
+            value = args[i]
+        options[name] = value if GLOBAL_OPTIONS[name] else None
+        i += 1
+
+    return options, args[i:]
+
 
 def main():
     # 测试环境中就直接在当前目录读配置
     omx_path = Path() if debug else Path.home() / ".omx"
     config_path = omx_path / "config.toml"
 
-    logger.add(omx_path / "omx.log", rotation="5MB")
+    options, args = split_global_options(argv[1:])
 
     app = OMX.from_config_file(config_path)
+    configure_logging(omx_path / "omx.log")
 
     if not omx_path.is_dir() or not config_path.exists():
         app.bootstrap()
 
-    app.run()
+    with ExitStack() as stack:
+        if options.get("--metrics"):
+            from ohmyxdu.metrics import collect_metrics
+
+            stack.enter_context(collect_metrics(Path(options["--metrics"])))
+
+        if "--profile" in options:
+            from ohmyxdu.profiling import profile
+
+            info = app.manifest.get(args[0].replace("-", "_")) if args else None
+            modules = ["ohmyxdu.console"] if info is None else ["ohmyxdu.console", info.module]
+            command = "omx" if info is None else info.command
+            stack.enter_context(profile(omx_path / "profile", command, modules))
+
+        if "--refresh" in options:
+            from ohmyxdu.cache import refresh_cache
+
+            stack.enter_context(refresh_cache())
+
+        if options.get("--format"):
+            from ohmyxdu.output import FORMATS, output_format
+
+            if options["--format"] not in FORMATS:
+                from ohmyxdu.manifest import index_parser
+
+                # 由参数解析器给出可选值并退出
+                index_parser(app.manifest, __version__).parse_args(argv[1:])
+
+            stack.enter_context(output_format(options["--format"]))
+
+        app.run(args)
 
 
 if __name__ == "__main__":
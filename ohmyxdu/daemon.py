@@ -0,0 +1,271 @@
+"""
+常驻进程
+
+omx serve 在本地 Unix socket 上监听，常驻内存的有 OMX 对象、已解密的账号、已导入的插件与已登录的验证会话，
+后台线程定期刷新会话，使其不会过期。omx call 等客户端通过 socket 调用插件，省去启动、导入与登录的开销:
+$ omx serve &
+$ omx call get-card-balance
+
+协议为每个连接一行 JSON 请求、一行 JSON 响应:
+{"command": "call", "plugin": "get_grade", "kwargs": {"year_semester": "2019-2020-1"}}
+{"ok": true, "result": {...}, "elapsed": 0.003}
+{"ok": false, "error": "..."}
+
+command 还可以是 ping（返回进程状态）与 shutdown。
+socket 文件只对当前用户可读写，修改配置文件后需重启常驻进程。
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, Optional
+import json
+import os
+import socket
+from contextvars import Context, copy_context
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import monotonic, perf_counter
+
+from ohmyxdu.log import logger
+from ohmyxdu.globals import set_current_plugin
+from ohmyxdu.output import jsonable
+
+if TYPE_CHECKING:
+    from ohmyxdu import OMX
+
+__all__ = ("SOCKET_FILE", "DaemonError", "Daemon", "call", "call_raw")
+
+SOCKET_FILE = "omx.sock"
+DEFAULT_REFRESH_INTERVAL = 5 * 60  # 秒，应小于 IDSAuth.SESSION_TRUST_TIME
+DEFAULT_TIMEOUT = 60
+
+# 单个请求的大小上限，防止异常的客户端占满内存
+MAX_REQUEST_SIZE = 1 << 20
+
+
+class DaemonError(RuntimeError):
+    """常驻进程不可用，或插件在常驻进程中执行失败"""
+
+
+def _recv_line(conn: socket.socket) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if b"\n" in chunk:
+            break
+        if size > MAX_REQUEST_SIZE:
+            raise ValueError("请求过大")
+    return b"".join(chunks).split(b"\n", 1)[0]
+
+
+class Daemon:
+    """
+    常驻进程
+
+    :param omx: 已初始化的 OMX 对象，常驻期间一直使用其配置
+    :param socket_path: 监听的 socket 路径
+    :param refresh_interval: 后台刷新会话的间隔（秒），0 为不刷新
+    """
+
+    def __init__(
+        self,
+        omx: "OMX",
+        socket_path: Path,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+    ):
+        from ohmyxdu.auth.warm import SessionCache
+
+        self.omx = omx
+        self.socket_path = socket_path
+        self.refresh_interval = refresh_interval
+        self.sessions = SessionCache()
+        self.started = monotonic()
+
+        # 处理请求的线程不会继承当前上下文，每个请求在它的副本中执行
+        self._context: Context = copy_context()
+        self._stop = Event()
+        self._server: Optional[socket.socket] = None
+        self._close_lock = Lock()
+
+    def _bind(self) -> socket.socket:
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonError("当前系统不支持 Unix socket")
+
+        if self.socket_path.exists():
+            try:
+                call_raw({"command": "ping"}, self.socket_path, timeout=1)
+            except DaemonError:
+                self.socket_path.unlink()  # 上次异常退出留下的
+            else:
+                raise DaemonError(f"已有常驻进程在 {self.socket_path} 上运行")
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先收紧 umask 再 bind，避免 socket 文件短暂地对其他用户可写
+        umask = os.umask(0o177)
+        try:
+            server.bind(str(self.socket_path))
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        return server
+
+    def serve_forever(self):
+        """监听直到收到 shutdown 或 KeyboardInterrupt"""
+
+        from ohmyxdu.auth.warm import install_session_cache
+
+        self._server = self._bind()
+        install_session_cache(self.sessions)
+        logger.info("常驻进程已启动，监听 {}", self.socket_path)
+
+        if self.refresh_interval > 0:
+            Thread(target=self._refresh_loop, name="omx-refresh", daemon=True).start()
+
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except OSError:
+                    break  # shutdown 时关闭了 socket
+                Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+            install_session_cache(None)
+
+    def close(self):
+        self._stop.set()
+        with self._close_lock:
+            server, self._server = self._server, None
+            if server is None:
+                return
+
+            try:
+                # 唤醒阻塞在 accept 上的主线程
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+            self.sessions.clear()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            started = perf_counter()
+            self._context.copy().run(self.sessions.refresh)
+            elapsed = (perf_counter() - started) * 1000
+            logger.debug("已刷新 {} 个会话，耗时 {:.0f} ms", len(self.sessions), elapsed)
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            try:
+                request = json.loads(_recv_line(conn))
+                response = self._context.copy().run(self.dispatch, request)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            conn.sendall(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+
+        if response.get("shutdown"):
+            self.close()
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理一个请求
+
+        :param request: 请求
+        :return: 响应，插件抛出的异常也会转为响应
+        """
+
+        command = request.get("command", "call")
+        if command == "ping":
+            return {
+                "ok": True,
+                "result": {
+                    "pid": os.getpid(),
+                    "uptime": monotonic() - self.started,
+                    "sessions": len(self.sessions),
+                },
+            }
+        if command == "shutdown":
+            return {"ok": True, "result": None, "shutdown": True}
+        if command != "call":
+            return {"ok": False, "error": f"未知命令 {command}"}
+
+        name = str(request.get("plugin", "")).replace("-", "_")
+        info = self.omx.manifest.get(name)
+        # 内建命令会读取终端输入或修改配置，不在常驻进程中执行
+        if info is None or info.module.startswith("ohmyxdu.builtins."):
+            return {"ok": False, "error": f"插件 {name} 不存在"}
+
+        from ohmyxdu.builtins.batch import coerce_options
+
+        started = perf_counter()
+        plugin = self.omx.load_plugin(name)
+        set_current_plugin(name)
+        try:
+            # JSON 中只有基本类型，Path 等参数需按注解转换
+            result = plugin(**coerce_options(plugin, request.get("kwargs", {})))
+        except Exception as e:
+            logger.opt(exception=e).error("插件 {} 执行失败", name)
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+        return {"ok": True, "result": jsonable(result), "elapsed": perf_counter() - started}
+
+
+def call_raw(
+    request: Dict[str, Any], socket_path: Path, timeout: float = DEFAULT_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    向常驻进程发送一个请求
+
+    :param request: 请求
+    :param socket_path: 常驻进程的 socket 路径
+    :param timeout: 超时（秒）
+    :return: 响应
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise DaemonError("当前系统不支持 Unix socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        try:
+            conn.connect(str(socket_path))
+            conn.sendall(json.dumps(request, ensure_ascii=False).encode() + b"\n")
+            data = _recv_line(conn)
+        except OSError as e:
+            raise DaemonError(f"无法连接常驻进程 {socket_path}，是否已运行 omx serve？") from e
+
+    if not data:
+        raise DaemonError("常驻进程没有响应")
+    return json.loads(data)
+
+
+def call(
+    plugin: str,
+    socket_path: Path,
+    kwargs: Optional[Dict[str, Any]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Any:
+    """
+    在常驻进程中执行插件
+
+    :param plugin: 插件名，例如 get_grade 或 get-grade
+    :param socket_path: 常驻进程的 socket 路径
+    :param kwargs: 传给插件的参数
+    :param timeout: 超时（秒）
+    :return: 插件返回值经 jsonable 转换后的结果
+    """
+
+    response = call_raw(
+        {"command": "call", "plugin": plugin, "kwargs": kwargs or {}}, socket_path, timeout
+    )
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", "未知错误"))
+    return response.get("result")
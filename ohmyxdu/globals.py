@@ -1,10 +1,19 @@
+from typing import Optional
 from contextvars import ContextVar
 
-__all__ = ("get_config", "set_config", "get_current_omx", "set_current_omx")
+__all__ = (
+    "get_config",
+    "set_config",
+    "get_current_omx",
+    "set_current_omx",
+    "get_current_plugin",
+    "set_current_plugin",
+)
 
 # 异步隔离
 _config = ContextVar("global_config")
 _current_omx = ContextVar("public_omx")
+_current_plugin = ContextVar("current_plugin", default=None)
 
 
 def get_config() -> dict:
@@ -40,3 +49,16 @@ def get_current_omx() -> "OMX":  # TODO: 解决循环 import
 
 
 set_current_omx = _current_omx.set
+
+
+def get_current_plugin() -> Optional[str]:
+    """
+    获取当前正在执行的插件名
+
+    :return: 插件名，不在插件中时为 None
+    """
+
+    return _current_plugin.get()
+
+
+set_current_plugin = _current_plugin.set
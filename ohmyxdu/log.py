@@ -0,0 +1,308 @@
+"""
+延迟导入的 logger 与日志配置
+
+loguru 本身的导入开销不小，而 omx version 这类命令根本不输出日志。
+此处的 logger 在第一次被使用时才导入 loguru，在此之前添加的 sink 会被暂存。
+
+loguru 每次调用都会先取调用栈、当前时间并构造记录，之后才由各 sink 按级别过滤，
+逐行处理数据时即使日志全被过滤掉也有可观的开销。此处的 trace、debug、info 会先与所有 sink 的最低级别比较，
+低于该级别时直接返回，既不导入 loguru 也不格式化消息。需要额外计算的消息可传入无参函数，只在确实输出时才调用:
+logger.debug("{}", row)
+logger.debug(lambda: f"共 {sum(len(p) for p in pages)} 条")
+只为日志准备数据的代码可用 logger.enabled("DEBUG") 整段跳过。
+
+终端的日志级别默认为 INFO，设置了环境变量 DEBUG 时为 DEBUG，也可由 LOGURU_LEVEL 指定。
+omx 命令行还会读取配置文件中的:
+[LOG]
+LEVEL = "DEBUG"  # 终端的日志级别
+FILE_LEVEL = "INFO"  # omx.log 的日志级别，默认与终端相同
+BACKGROUND = true  # 由后台线程格式化并写入 omx.log，见 BackgroundFileSink
+"""
+
+from typing import Any, Callable, List, Optional, Tuple, Union
+import sys
+from os import environ
+from pathlib import Path
+from functools import wraps
+from threading import Lock
+
+from ohmyxdu.globals import get_config
+
+__all__ = ("logger", "LEVELS", "default_level", "BackgroundFileSink", "configure_logging")
+
+# loguru 的内置级别
+LEVELS = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+LOG_FILE_ROTATION = 5 * 1024 * 1024  # 字节
+
+Level = Union[str, int]
+
+
+def default_level() -> str:
+    """
+    终端的默认日志级别
+
+    :return: LOGURU_LEVEL，未设置时开启了 DEBUG 环境变量为 DEBUG，否则为 INFO
+    """
+
+    return environ.get("LOGURU_LEVEL") or ("DEBUG" if environ.get("DEBUG") else "INFO")
+
+
+def _levelno(level: Level) -> int:
+    """
+    >>> _levelno('debug'), _levelno(15), _levelno('15')
+    (10, 15, 15)
+    """
+
+    if isinstance(level, int):
+        return level
+    if level.isdigit():
+        return int(level)
+    # 自定义级别的数值无从得知，按最低处理，不会因此漏掉日志
+    return LEVELS.get(level.upper(), 0)
+
+
+class _LazyLogger:
+    def __init__(self):
+        self._logger = None
+        self._core = None
+        self._caller = None
+        self._pending_sinks: List[Tuple[tuple, dict]] = []
+        self._stderr_level: Level = default_level()
+        self._stderr_id: Optional[int] = None
+        self._pending_min = _levelno(self._stderr_level)
+        self._load_lock = Lock()
+
+    def _load(self):
+        # 多个线程可能同时第一次输出日志，只能由一个线程添加暂存的 sink
+        with self._load_lock:
+            if self._logger is not None:
+                return self._logger
+
+            from loguru import logger
+
+            try:
+                # 导入 loguru 时添加的默认 sink，换成 omx 的级别
+                logger.remove(0)
+            except ValueError:
+                pass  # 调用方已自行配置过 loguru，保持原样
+            else:
+                self._stderr_id = logger.add(sys.stderr, level=self._stderr_level)
+
+            for args, kwargs in self._pending_sinks:
+                logger.add(*args, **kwargs)
+
+            # loguru 各版本都在 _core.min_level 中维护所有 sink 的最低级别
+            self._core = getattr(logger, "_core", None)
+            # 经过 trace/debug/info 与 _log 两层，调用方在第 2 层
+            self._caller = logger.opt(depth=2)
+            # sink 都添加完后才公开，其他线程看到 _logger 时不会再走 add 的暂存分支
+            self._pending_sinks.clear()
+            self._logger = logger
+            return logger
+
+    @property
+    def min_level(self) -> float:
+        """所有 sink 的最低级别，没有 sink 时为 inf"""
+
+        if self._logger is None:
+            return self._pending_min
+        if self._core is None:
+            return 0
+        return self._core.min_level
+
+    def enabled(self, level: Level) -> bool:
+        """
+        指定级别的日志是否会被某个 sink 输出，不会导入 loguru
+
+        :param level: 级别名或数值
+        """
+
+        return _levelno(level) >= self.min_level
+
+    def set_level(self, level: Level):
+        """
+        修改终端的日志级别
+
+        :param level: 级别名或数值
+        """
+
+        self._stderr_level = level
+        if self._logger is None:
+            levels = [kwargs["level"] for _, kwargs in self._pending_sinks]
+            self._pending_min = min(_levelno(x) for x in [level] + levels)
+        elif self._stderr_id is not None:
+            try:
+                self._logger.remove(self._stderr_id)
+            except ValueError:
+                self._stderr_id = None  # 已被调用方移除，不再加回
+                return
+            self._stderr_id = self._logger.add(sys.stderr, level=level)
+
+    def add(self, *args, **kwargs):
+        """
+        与 loguru 的 logger.add 相同，但未指定 level 时与终端的级别相同，
+        且 loguru 尚未导入时只记录下来，返回 None
+        """
+
+        kwargs.setdefault("level", self._stderr_level)
+        if self._logger is None:
+            with self._load_lock:
+                if self._logger is None:
+                    self._pending_sinks.append((args, kwargs))
+                    self._pending_min = min(self._pending_min, _levelno(kwargs["level"]))
+                    return None
+        return self._logger.add(*args, **kwargs)
+
+    def _log(self, level: str, levelno: int, message: Union[str, Callable[[], Any]], args, kwargs):
+        if levelno < self.min_level:
+            return
+        if callable(message):
+            message = message()
+        if self._logger is None:
+            self._load()
+        self._caller.log(level, message, *args, **kwargs)
+
+    def trace(self, message: Union[str, Callable[[], Any]], *args, **kwargs):
+        self._log("TRACE", 5, message, args, kwargs)
+
+    def debug(self, message: Union[str, Callable[[], Any]], *args, **kwargs):
+        self._log("DEBUG", 10, message, args, kwargs)
+
+    def info(self, message: Union[str, Callable[[], Any]], *args, **kwargs):
+        self._log("INFO", 20, message, args, kwargs)
+
+    def catch(self, function):
+        """
+        与 loguru 的 logger.catch 用作装饰器时相同，但只在真的捕获到异常时才导入 loguru
+
+        :param function: 被装饰的函数
+        """
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                # 在 except 块中重新抛出，交给 loguru 记录完整的异常信息
+                with (self._logger or self._load()).catch():
+                    raise
+
+        return wrapper
+
+    def __getattr__(self, name: str):
+        value = getattr(self._logger or self._load(), name)
+        # 缓存在实例上，之后的访问不再经过 __getattr__
+        setattr(self, name, value)
+        return value
+
+
+logger = _LazyLogger()
+
+
+class BackgroundFileSink:
+    """
+    由后台线程写入的日志文件
+
+    调用方只把消息放入队列，时间、级别等前缀的格式化与写入都在后台线程中完成。
+    loguru 格式化 {time:...} 的开销比消息本身还大，因此添加时应使用 format="{message}"，
+    前缀的格式与 loguru 默认的相同。
+    loguru 0.5 的 enqueue=True 经由 multiprocessing 的队列，每条记录都要 pickle，调用方的开销反而更大。
+
+    :param path: 日志文件
+    :param rotation: 文件超过该大小（字节）时改名保存，另起新文件
+    """
+
+    def __init__(self, path: Path, rotation: int = LOG_FILE_ROTATION):
+        self.path = path
+        self.rotation = rotation
+        self._queue = None
+        self._thread = None
+        self._start_lock = Lock()
+
+    def _start(self):
+        from queue import SimpleQueue
+        from threading import Thread
+
+        with self._start_lock:
+            if self._thread is None:
+                self._queue = SimpleQueue()
+                self._thread = Thread(target=self._run, name="omx-log", daemon=True)
+                self._thread.start()
+
+    def write(self, message: str):
+        if self._thread is None:
+            self._start()  # 没有日志时不启动线程
+        self._queue.put(message)
+
+    def stop(self):
+        """写完队列中的消息后停止，loguru 移除 sink 时（包括退出时）会调用"""
+
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def format(message: Any) -> str:
+        record = message.record
+        time = record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        return (
+            f"{time} | {record['level'].name: <8} | "
+            f"{record['name']}:{record['function']}:{record['line']} - {message}"
+        )
+
+    def _rotate(self, file):
+        from datetime import datetime
+
+        file.close()
+        stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
+        self.path.rename(self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}"))
+        return self.path.open("a", encoding="utf-8")
+
+    def _run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = self.path.open("a", encoding="utf-8")
+        try:
+            while True:
+                message = self._queue.get()
+                if message is None:
+                    break
+                file.write(self.format(message))
+                # 积压时连续写出，队列空了再刷新
+                if self._queue.empty():
+                    file.flush()
+                    if file.tell() >= self.rotation:
+                        file = self._rotate(file)
+        finally:
+            file.close()
+
+
+def configure_logging(log_file: Optional[Path] = None):
+    """
+    按配置文件中的 [LOG] 设置终端的日志级别，并添加日志文件
+
+    :param log_file: 日志文件，为空时不写文件
+    """
+
+    config = get_config().get("LOG", {})
+
+    if "LEVEL" in config:
+        logger.set_level(config["LEVEL"])
+
+    if log_file is None:
+        return
+
+    level = config.get("FILE_LEVEL", logger._stderr_level)
+    if config.get("BACKGROUND", False):
+        logger.add(BackgroundFileSink(log_file), level=level, format="{message}")
+    else:
+        logger.add(log_file, level=level, rotation=LOG_FILE_ROTATION)
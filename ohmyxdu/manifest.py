@@ -0,0 +1,322 @@
+"""
+插件清单
+
+通过静态解析插件源码得到插件名称、介绍与参数，无需导入插件本身。
+ast 等模块只在扫描时导入，读取缓存时用不到。
+清单会缓存在数据目录中，插件文件的修改时间变化后自动重建。
+omx show 与 omx --help 直接由清单生成，不会构造插件的参数解析器。
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from json import dumps, loads
+from pathlib import Path
+from importlib.util import find_spec
+from sys import path as sys_path
+
+from ohmyxdu.log import logger
+
+if TYPE_CHECKING:
+    from ast import AST
+    from argparse import ArgumentParser
+
+__all__ = ("PluginInfo", "ENTRY_POINT_GROUP", "load_manifest", "scan_plugins", "index_parser")
+
+# 第三方包可通过该组的 entry point 提供插件，形如 get_foo = "omx_foo:get_foo"
+ENTRY_POINT_GROUP = "ohmyxdu.plugins"
+
+MANIFEST_FILE = "plugins.json"
+MANIFEST_VERSION = 3
+
+LIB_PATH = Path(__file__).parent
+PLUGIN_DIRS = ("builtins", "plugins")  # 内建插件不会有返回值，目前其对应的函数不应该直接被调用
+
+
+class PluginInfo(NamedTuple):
+    name: str  # 插件函数名，同时也是命令名（下划线换为连字符）
+    module: str  # 所在模块
+    summary: str  # 介绍，即 docstring 中参数说明之前的部分
+    # 参数名、种类、注解与默认值（均为源码文本）、是否有默认值及说明
+    # Python 3.8 之前无法取得源码文本，注解与默认值均为 None，需用 has_default 判断
+    params: List[Dict[str, Any]]
+
+    @property
+    def command(self) -> str:
+        return self.name.replace("_", "-")
+
+    @property
+    def brief(self) -> str:
+        """介绍的第一段"""
+
+        return self.summary.split("\n\n")[0].replace("\n", "")
+
+
+class _Source(NamedTuple):
+    name: str
+    module: str
+    path: Optional[Path]
+
+
+def _mtime(path: Path) -> float:
+    if path.name == "__init__.py":
+        # 模块插件以整个目录中最新的文件为准
+        return max(p.stat().st_mtime for p in path.parent.rglob("*.py"))
+    return path.stat().st_mtime
+
+
+def _entry_points() -> list:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python 3.7
+        try:
+            from importlib_metadata import entry_points
+        except ImportError:
+            return []
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, []))
+
+
+def _local_sources() -> Iterator[_Source]:
+    for dir_name in PLUGIN_DIRS:
+        for path in sorted((LIB_PATH / dir_name).iterdir()):
+            if path.name.startswith("_"):
+                continue
+            if path.suffix == ".py":
+                yield _Source(path.stem, f"ohmyxdu.{dir_name}.{path.stem}", path)
+            elif (path / "__init__.py").is_file():
+                yield _Source(path.name, f"ohmyxdu.{dir_name}.{path.name}", path / "__init__.py")
+
+
+def _sources() -> Iterator[_Source]:
+    yield from _local_sources()
+
+    for ep in _entry_points():
+        module, _, attr = ep.value.partition(":")
+        try:
+            spec = find_spec(module)
+        except (ImportError, ValueError):
+            spec = None
+        origin = Path(spec.origin) if spec is not None and spec.origin else None
+        yield _Source(attr or ep.name, module, origin)
+
+
+def _fingerprint() -> List[Tuple[str, float]]:
+    """
+    判断清单是否过期的依据
+
+    包括内建插件源码的修改时间，以及 sys.path 中各目录的修改时间（安装新包时会变化），
+    后者用于发现 entry point 插件的增删，这样检查缓存时不必枚举所有已安装包的元数据
+    """
+
+    r = []
+    for source in _local_sources():
+        r.append((str(source.path), _mtime(source.path)))
+    for p in sys_path:
+        if not p:
+            continue  # 当前目录
+        try:
+            r.append((p, Path(p).stat().st_mtime))
+        except (OSError, ValueError):
+            pass
+    return r
+
+
+def _segment(source: str, node: Optional["AST"]) -> Optional[str]:
+    import ast
+
+    if node is None:
+        return None
+    get_source_segment = getattr(ast, "get_source_segment", None)  # Python 3.8+
+    if get_source_segment is None:
+        return None
+    return get_source_segment(source, node)
+
+
+def _parse_docstring(doc: str) -> Tuple[str, Dict[str, str]]:
+    """
+    拆分 docstring 中的介绍与参数说明
+
+    >>> _parse_docstring('介绍\\n\\n:param a: 参数 a\\n    续行\\n:return:')
+    ('介绍', {'a': '参数 a 续行'})
+    """
+
+    import re
+
+    field_pattern = re.compile(r"^:(\w+)(?:\s+(\w+))?:\s*(.*)$")
+
+    summary = []
+    params = {}
+    current = None
+    for line in doc.splitlines():
+        line = line.strip()
+        match = field_pattern.match(line)
+        if match:
+            field, name, text = match.groups()
+            current = name if field == "param" and name else None
+            if current is not None:
+                params[current] = text
+        elif current is not None and line:
+            params[current] = f"{params[current]} {line}"
+        elif not params and current is None and not line.startswith(">>>"):
+            summary.append(line)
+
+    return "\n".join(summary).strip(), params
+
+
+def _parse(source: _Source) -> Optional[PluginInfo]:
+    if source.path is None:
+        # 无法定位源码的第三方插件只能记录名字
+        return PluginInfo(source.name, source.module, "", [])
+
+    import ast
+
+    text = source.path.read_text(encoding="utf-8")
+    tree = ast.parse(text)
+
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == source.name:
+            break
+    else:
+        logger.warning("插件 {} 没有公开入口", source.name)
+        return None
+
+    summary, params_doc = _parse_docstring(ast.get_docstring(node) or "")
+
+    args = node.args
+    params = []
+    positional = args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    for arg, default in zip(positional, defaults):
+        params.append(
+            {
+                "name": arg.arg,
+                "kind": "positional",
+                "annotation": _segment(text, arg.annotation),
+                "default": _segment(text, default),
+                "has_default": default is not None,
+                "doc": params_doc.get(arg.arg, ""),
+            }
+        )
+    if args.vararg is not None:
+        params.append(
+            {
+                "name": args.vararg.arg,
+                "kind": "var_positional",
+                "annotation": _segment(text, args.vararg.annotation),
+                "default": None,
+                "has_default": True,  # 可以不传
+                "doc": params_doc.get(args.vararg.arg, ""),
+            }
+        )
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        params.append(
+            {
+                "name": arg.arg,
+                "kind": "keyword",
+                "annotation": _segment(text, arg.annotation),
+                "default": _segment(text, default),
+                "has_default": default is not None,
+                "doc": params_doc.get(arg.arg, ""),
+            }
+        )
+
+    return PluginInfo(source.name, source.module, summary, params)
+
+
+def scan_plugins() -> Dict[str, PluginInfo]:
+    """
+    扫描所有插件，不导入插件本身
+
+    :return: 插件名到插件信息的映射
+    """
+
+    r = {}
+    for source in _sources():
+        info = _parse(source)
+        if info is not None:
+            r[info.name] = info
+    return r
+
+
+def load_manifest(cache_path: Optional[Path] = None) -> Dict[str, PluginInfo]:
+    """
+    读取插件清单，缓存过期时重新扫描
+
+    :param cache_path: 缓存目录，为空时不缓存
+    :return: 插件名到插件信息的映射
+    """
+
+    fingerprint = _fingerprint()
+
+    manifest_file = cache_path / MANIFEST_FILE if cache_path is not None else None
+    if manifest_file is not None:
+        try:
+            cached = loads(manifest_file.read_text())
+        except (OSError, ValueError):
+            cached = None
+
+        if (
+            cached is not None
+            and cached.get("version") == MANIFEST_VERSION
+            and [tuple(f) for f in cached["fingerprint"]] == fingerprint
+        ):
+            return {p[0]: PluginInfo(*p) for p in cached["plugins"]}
+
+    logger.debug("插件清单已过期，重新扫描")
+    plugins = scan_plugins()
+
+    if manifest_file is not None:
+        try:
+            manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            manifest_file.write_text(
+                dumps(
+                    {
+                        "version": MANIFEST_VERSION,
+                        "fingerprint": fingerprint,
+                        "plugins": list(plugins.values()),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        except OSError:
+            logger.debug("无法写入插件清单 {}", manifest_file)
+
+    return plugins
+
+
+def index_parser(manifest: Dict[str, PluginInfo], version: str) -> "ArgumentParser":
+    """
+    仅由清单构造顶层命令解析器，用于输出帮助与报错
+
+    子命令只有名称与介绍，不含参数，因此无需导入任何插件
+
+    :param manifest: 插件清单
+    :param version: 程序版本
+    :return:
+    """
+
+    from argparse import ArgumentParser
+    from ohmyxdu.output import FORMATS
+
+    parser = ArgumentParser(prog="omx")
+    parser.add_argument("--version", action="version", version=f"oh-my-xdu v{version}")
+    # 全局选项由 ohmyxdu.console 处理，此处只为出现在帮助信息中
+    parser.add_argument(
+        "--metrics", metavar="PATH", help="记录所有请求的统计信息，.json 结尾时输出 JSON，否则输出 Prometheus 文本格式"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="剖析本次运行，结果保存在 ~/.omx/profile 下"
+    )
+    parser.add_argument("--refresh", action="store_true", help="跳过结果缓存，重新获取数据")
+    parser.add_argument(
+        "--format", choices=tuple(FORMATS), help="结果以指定格式逐条输出到标准输出，不再经过日志格式化"
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    for info in manifest.values():
+        subparsers.add_parser(info.command, help=info.brief)
+
+    return parser
@@ -0,0 +1,189 @@
+"""
+请求统计
+
+RequestMetrics 可直接作为 Auth 的请求钩子，按 (验证方式, 插件, 主机) 汇总请求的耗时、响应大小、
+状态码与重定向次数，结束后导出为 Prometheus 文本格式或 JSON:
+metrics = RequestMetrics()
+BaseAuth.add_request_hook(metrics)
+get_grade()
+metrics.dump(Path("metrics.prom"))
+
+命令行中可使用 omx --metrics metrics.prom get-grade，批量执行时同样适用。
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import json
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from urllib.parse import urlsplit
+
+from ohmyxdu.auth import BaseAuth, RequestRecord
+
+__all__ = ("Histogram", "RequestMetrics", "collect_metrics")
+
+# 秒
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 字节
+SIZE_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20)
+
+Labels = Tuple[Optional[str], Optional[str], str]
+
+
+class Histogram:
+    """累积直方图，桶的上界与 Prometheus 的 le 含义相同"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: [(le, 不大于 le 的观测数), ...]，最后一项为 +Inf
+        """
+
+        r = []
+        total = 0
+        for le, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            r.append(("+Inf" if le == float("inf") else f"{le:g}", total))
+        return r
+
+
+class _Series:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses: Counter = Counter()
+        self.redirects = 0
+
+
+class RequestMetrics:
+    """线程安全的请求统计，实例本身就是请求钩子"""
+
+    def __init__(self):
+        self._series: Dict[Labels, _Series] = {}
+        self._lock = Lock()
+
+    def __call__(self, record: RequestRecord):
+        labels = (record.auth_name, record.plugin, urlsplit(record.url).netloc)
+        status = "error" if record.status is None else str(record.status)
+
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Series()
+            series.latency.observe(record.elapsed)
+            series.size.observe(record.size)
+            series.statuses[status] += 1
+            series.redirects += record.redirects
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: 可直接序列化为 JSON 的统计结果
+        """
+
+        with self._lock:
+            return {
+                "series": [
+                    {
+                        "auth": auth,
+                        "plugin": plugin,
+                        "host": host,
+                        "requests": s.latency.count,
+                        "statuses": dict(s.statuses),
+                        "redirects": s.redirects,
+                        "latency_seconds": {
+                            "sum": s.latency.sum,
+                            "buckets": dict(s.latency.cumulative()),
+                        },
+                        "response_bytes": {
+                            "sum": s.size.sum,
+                            "buckets": dict(s.size.cumulative()),
+                        },
+                    }
+                    for (auth, plugin, host), s in self._series.items()
+                ]
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: Prometheus 文本格式，可交给 node_exporter 的 textfile collector
+        """
+
+        def label_text(labels: Labels, **extra: str) -> str:
+            auth, plugin, host = labels
+            pairs = dict(auth=auth or "", plugin=plugin or "", host=host, **extra)
+            return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+        def family(name: str, kind: str, help_text: str) -> List[str]:
+            return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+        with self._lock:
+            series = list(self._series.items())
+
+            lines = family("omx_requests_total", "counter", "请求数")
+            for labels, s in series:
+                for status, count in s.statuses.items():
+                    text = label_text(labels, status=status)
+                    lines.append(f"omx_requests_total{{{text}}} {count}")
+
+            lines += family("omx_redirects_total", "counter", "跟随的重定向数")
+            for labels, s in series:
+                lines.append(f"omx_redirects_total{{{label_text(labels)}}} {s.redirects}")
+
+            for name, attr, help_text in (
+                ("omx_request_duration_seconds", "latency", "请求耗时，包含重定向"),
+                ("omx_response_size_bytes", "size", "响应体大小"),
+            ):
+                lines += family(name, "histogram", help_text)
+                for labels, s in series:
+                    histogram: Histogram = getattr(s, attr)
+                    for le, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{{{label_text(labels, le=le)}}} {count}")
+                    lines.append(f"{name}_sum{{{label_text(labels)}}} {histogram.sum:g}")
+                    lines.append(f"{name}_count{{{label_text(labels)}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Path):
+        """
+        写入文件，扩展名为 .json 时输出 JSON，否则输出 Prometheus 文本格式
+
+        :param path: 输出路径
+        """
+
+        if path.suffix == ".json":
+            path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+        else:
+            path.write_text(self.to_prometheus())
+
+
+@contextmanager
+def collect_metrics(path: Path) -> Iterator[RequestMetrics]:
+    """
+    在 with 块内统计所有请求，退出时（包括出错时）写入 path
+
+    :param path: 输出路径，扩展名为 .json 时输出 JSON
+    """
+
+    metrics = RequestMetrics()
+    BaseAuth.add_request_hook(metrics)
+    try:
+        yield metrics
+    finally:
+        BaseAuth.remove_request_hook(metrics)
+        metrics.dump(path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
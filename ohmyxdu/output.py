@@ -0,0 +1,246 @@
+"""
+机器可读的输出
+
+在插件名之前加上 --format json|ndjson|csv 时，插件的结果（Grade、Package、借书记录、余额等）
+在产出时逐条写到标准输出，不经过日志格式化，日志仍输出到标准错误，便于接入管道:
+$ omx --format ndjson get-grade | jq -r .course_name
+
+插件中的写法，未指定格式时 emit 返回 False，照常输出日志:
+for book in books:
+    if not emit(book):
+        logger.success(book["title"])
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+import json
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+__all__ = (
+    "FORMATS",
+    "RecordWriter",
+    "JSONWriter",
+    "NDJSONWriter",
+    "CSVWriter",
+    "jsonable",
+    "get_output",
+    "emit",
+    "emit_many",
+    "output_format",
+    "muted_output",
+)
+
+_output = ContextVar("output_writer", default=None)
+
+
+def jsonable(value: Any) -> Any:
+    """
+    将插件的返回值转为可被 JSON 序列化的值
+
+    NamedTuple 转为对象，其他序列转为数组，日期时间使用 ISO 8601
+    >>> from collections import namedtuple
+    >>> from pathlib import Path
+    >>> jsonable({'a': [namedtuple('P', 'x y')(1, Path('b'))]})
+    {'a': [{'x': 1, 'y': 'b'}]}
+    """
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {k: jsonable(v) for k, v in value._asdict().items()}
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [jsonable(v) for v in value]
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class RecordWriter:
+    """
+    将结果逐条写入文本流，可在多线程间共用
+
+    :param stream: 输出流
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.count = 0
+        self._lock = Lock()
+
+    def write(self, records: Iterable[Any]):
+        """
+        写入若干条结果并刷新输出流
+
+        :param records: 结果，会先经过 jsonable 转换
+        """
+
+        with self._lock:
+            for record in records:
+                self._write(jsonable(record))
+                self.count += 1
+            self.stream.flush()
+
+    def _write(self, record: Any):
+        raise NotImplementedError
+
+    def close(self):
+        """写出格式要求的结尾，不关闭输出流"""
+
+        self.stream.flush()
+
+
+class NDJSONWriter(RecordWriter):
+    """每行一个 JSON 对象"""
+
+    def _write(self, record: Any):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class JSONWriter(RecordWriter):
+    """一个 JSON 数组，元素仍在产出时写出，而不是结束时才一次写出"""
+
+    def _write(self, record: Any):
+        self.stream.write("[\n  " if self.count == 0 else ",\n  ")
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+
+    def close(self):
+        with self._lock:
+            self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+        super().close()
+
+
+class CSVWriter(RecordWriter):
+    """
+    表头取自第一条结果的字段，字段变化时空一行另起表头
+
+    嵌套的值以 JSON 写入单元格，None 为空
+    """
+
+    def __init__(self, stream: TextIO):
+        import csv
+
+        super().__init__(stream)
+        self._writer = csv.writer(stream, lineterminator="\n")
+        self._fields: Optional[List[str]] = None
+
+    @staticmethod
+    def _cell(value: Any) -> Any:
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def _write(self, record: Any):
+        if not isinstance(record, dict):
+            record = {"value": record}
+
+        fields = list(record)
+        if fields != self._fields:
+            if self._fields is not None:
+                self.stream.write("\n")
+            self._writer.writerow(fields)
+            self._fields = fields
+        self._writer.writerow([self._cell(v) for v in record.values()])
+
+
+class _DiscardWriter(RecordWriter):
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    def write(self, records: Iterable[Any]):
+        pass
+
+    def close(self):
+        pass
+
+
+FORMATS: Dict[str, type] = {"json": JSONWriter, "ndjson": NDJSONWriter, "csv": CSVWriter}
+
+
+def get_output() -> Optional[RecordWriter]:
+    """
+    获取当前的输出
+
+    :return: 未指定 --format 时为 None
+    """
+
+    return _output.get()
+
+
+def emit(record: Any) -> bool:
+    """
+    输出一条结果
+
+    :param record: 结果，NamedTuple、dict 或其他可被 jsonable 转换的值
+    :return: 是否已输出，为 False 时调用方应照常输出日志
+    """
+
+    writer = _output.get()
+    if writer is None:
+        return False
+    writer.write((record,))
+    return True
+
+
+def emit_many(records: Iterable[Any]) -> bool:
+    """
+    输出多条结果，只刷新一次输出流
+
+    :param records: 结果
+    :return: 是否已输出，为 False 时调用方应照常输出日志
+    """
+
+    writer = _output.get()
+    if writer is None:
+        return False
+    writer.write(records)
+    return True
+
+
+@contextmanager
+def output_format(name: str, stream: Optional[TextIO] = None) -> Iterator[RecordWriter]:
+    """
+    with 块内 emit 的结果以指定格式写出
+
+    :param name: json、ndjson 或 csv
+    :param stream: 输出流，默认为标准输出
+    """
+
+    try:
+        writer_class = FORMATS[name]
+    except KeyError:
+        raise ValueError(f"不支持的输出格式 {name}，可选 {', '.join(FORMATS)}")
+
+    writer = writer_class(sys.stdout if stream is None else stream)
+    token = _output.set(writer)
+    try:
+        yield writer
+    finally:
+        _output.reset(token)
+        writer.close()
+
+
+@contextmanager
+def muted_output() -> Iterator[Optional[RecordWriter]]:
+    """
+    指定了输出格式时，with 块内 emit 的结果被丢弃，插件也不再输出日志，
+    供 omx batch 等自行汇总结果的命令使用
+
+    :return: 原来的输出，未指定 --format 时为 None
+    """
+
+    writer = _output.get()
+    if writer is None:
+        yield None
+        return
+
+    token = _output.set(_DiscardWriter())
+    try:
+        yield writer
+    finally:
+        _output.reset(token)
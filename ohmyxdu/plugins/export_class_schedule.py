@@ -1,16 +1,38 @@
-from typing import Optional, NamedTuple
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, NamedTuple, List, Tuple, Union
 from pathlib import Path
 from datetime import datetime, timedelta
+from functools import reduce
+from hashlib import blake2s
+from math import gcd
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 
-from loguru import logger
-
+from ohmyxdu.log import logger
 from ohmyxdu.auth.ids import IDSAuth
-from ohmyxdu.utils.icalendar_helper import ClassSchedule
+from ohmyxdu.cache import result_cache
+from ohmyxdu.output import emit
+from ohmyxdu.utils.jwapp import JwappClient, extract_rows
+
+# 学年学期相关的函数原先定义在本模块，仍从这里导出，以免影响第三方调用
+from ohmyxdu.utils.semester import (
+    BASE_URL,
+    SERVICE_URL,
+    YEAR_SEMESTER_URL,
+    YEAR_SEMESTER_INFO_URL,
+    YearSemester,
+    get_semester_code,
+    get_latest_year_semester,
+    get_start_time,
+    latest_year_semester,
+    parse_start_time,
+    parse_year_semester,
+    semester_start_time,
+    start_time_query,
+)
+
+if TYPE_CHECKING:
+    from ohmyxdu.utils.icalendar_helper import ClassSchedule
 
-BASE_URL = "http://ehall.xidian.edu.cn"
-SERVICE_URL = BASE_URL + "/appShow?appId=4770397878132218"
-YEAR_SEMESTER_URL = BASE_URL + "/jwapp/sys/wdkb/modules/jshkcb/dqxnxq.do"
-YEAR_SEMESTER_INFO_URL = BASE_URL + "/jwapp/sys/wdkb/modules/jshkcb/cxjcs.do"
 CLASS_SCHEDULE_URL = BASE_URL + "/jwapp/sys/wdkb/modules/xskcb/xskcb.do"
 
 # 上课时间 [(begin, end), ...]
@@ -18,37 +40,84 @@ MORNING_TIME = [("8:30", "10:05"), ("10:25", "12:00")]
 CLASS_TIME = MORNING_TIME + [("14:00", "15:35"), ("15:55", "17:30"), ("19:00", "20:35")]
 
 
-class YearSemester(NamedTuple):
-    school_year: int
-    semester: int
-
-
-def get_semester_code(year_semester: YearSemester) -> str:
-    """
-    学年学期代号转换
+class ClassEvent(NamedTuple):
+    course_code: str
+    course_name: str
+    location: str
+    week: int  # 第几周，从 0 开始
+    weekday: int  # 0 为周一
+    period: int  # CLASS_TIME 的下标
+    start: datetime
+    end: datetime
+
+    @property
+    def uid_key(self) -> str:
+        return f"{self.course_code}/{self.weekday}/{self.period}/{self.week}"
+
+    def ics_properties(self) -> List[Tuple[str, str]]:
+        return []
+
+
+class RecurringClass(NamedTuple):
+    """同一门课在一个学期内的所有上课时间，对应一个带 RRULE 的事件"""
+
+    course_code: str
+    course_name: str
+    location: str
+    weekday: int
+    period: int
+    weeks: List[int]
+    start: datetime  # 第一次上课
+    end: datetime
+    interval: int  # 间隔周数
+    count: int  # RRULE 产生的次数，包括被 EXDATE 排除的
+    exdates: List[datetime]
+
+    @property
+    def uid_key(self) -> str:
+        return f"{self.course_code}/{self.weekday}/{self.period}"
+
+    def ics_properties(self) -> List[Tuple[str, str]]:
+        from ohmyxdu.utils.ics import format_datetime
+
+        properties = []
+        if self.count > 1:
+            rule = "FREQ=WEEKLY"
+            if self.interval > 1:
+                rule += f";INTERVAL={self.interval}"
+            properties.append(("RRULE", f"{rule};COUNT={self.count}"))
+        if self.exdates:
+            properties.append(
+                ("EXDATE;VALUE=DATE-TIME", ",".join(map(format_datetime, self.exdates)))
+            )
+        return properties
 
-    :param year_semester: 学年学期对象
-    :return: 形如 '2019-2020-1' 的学年学期代号
-    >>> get_semester_code(YearSemester(2019,1))
-    '2019-2020-1'
-    """
 
-    return f"{year_semester.school_year}-{year_semester.school_year + 1}-{year_semester.semester}"
+class CourseSlot(NamedTuple):
+    """xskcb 中的一行：一门课在每周固定的一个时段"""
 
+    course_code: str
+    course_name: str
+    location: str
+    weekday: int
+    period: int
+    weeks: List[int]
+    first_start: datetime  # 第 0 周对应的上课时间
+    duration: timedelta
 
-def get_latest_year_semester(token: IDSAuth) -> YearSemester:
-    """
-    获取当前学年学期
 
-    :param token: IDS令牌
-    :return:
-    """
+class ScheduleData(NamedTuple):
+    username: str
+    year_semester: YearSemester
+    semester_start_time: datetime
+    schedule_row: List[dict]
 
-    # 获取学年学期
-    resp = token.get(YEAR_SEMESTER_URL)
 
-    data = resp.json()["datas"]["dqxnxq"]["rows"][0]["DM"].split("-")
-    return YearSemester(int(data[0]), int(data[2]))
+class ExportResult(NamedTuple):
+    count: int  # 事件总数
+    changed: int  # 新增或内容变动的事件数
+    removed: int  # 上次导出中有、本次没有的事件数
+    written: bool  # 没有任何变化时不会重写文件
 
 
 def clock_to_timedelta(clock: str) -> timedelta:
@@ -65,28 +134,32 @@ def clock_to_timedelta(clock: str) -> timedelta:
     return timedelta(hours=int(hours), minutes=int(minutes))
 
 
-def get_start_time(token: IDSAuth, year_semester: YearSemester) -> datetime:
-    """
-    获取指定学年开始时间
+# 每节课相对当天零点的 (开始, 结束)，展开课程时不再逐个解析时刻
+CLASS_OFFSETS = [(clock_to_timedelta(begin), clock_to_timedelta(end)) for begin, end in CLASS_TIME]
+WEEK = timedelta(weeks=1)
 
-    :param token: IDS令牌
-    :param year_semester: 学年学期
-    :return: 该学年开始时间
-    """
 
-    semester_code = get_semester_code(year_semester)
+def course_weeks(bitmap: str) -> List[int]:
+    """
+    由 SKZC 周次位图得到有课的周
 
-    post_data = {"XN": semester_code[:-2], "XQ": semester_code[-1:]}
-    resp = token.post(YEAR_SEMESTER_INFO_URL, data=post_data)
+    :param bitmap: 形如 '0111100' 的字符串，第 i 位为 1 表示第 i 周（从 0 开始）有课
+    :return:
+    >>> course_weeks('0110010')
+    [1, 2, 5]
+    """
 
-    return datetime.strptime(
-        resp.json()["datas"]["cxjcs"]["rows"][0]["XQKSRQ"], "%Y-%m-%d %H:%M:%S"
-    )
+    weeks = []
+    week = bitmap.find("1")
+    while week != -1:
+        weeks.append(week)
+        week = bitmap.find("1", week + 1)
+    return weeks
 
 
 def get_class_schedule(
     token: IDSAuth, year_semester: YearSemester
-) -> ClassSchedule:  # TODO: 更换对第三方更友好的参数
+) -> "ClassSchedule":  # TODO: 更换对第三方更友好的参数
     """
     获取指定学年课程表
 
@@ -98,69 +171,354 @@ def get_class_schedule(
     :return: 课程表
     """
 
+    return build_class_schedule(
+        *get_class_schedule_rows(token, year_semester), get_semester_code(year_semester)
+    )
+
+
+def get_class_schedule_rows(
+    token: IDSAuth, year_semester: YearSemester
+) -> Tuple[datetime, List[dict]]:
+    """
+    获取指定学年的学期开始时间与原始课程数据
+
+    :param token: IDS令牌
+    :param year_semester: 学年学期
+    :return: (学期开始时间, xskcb 接口返回的 rows)
+    """
+
     post_data = {"XNXQDM": get_semester_code(year_semester)}
 
-    resp = token.post(CLASS_SCHEDULE_URL, data=post_data)
+    # 两个请求互不依赖，学期开始时间未命中缓存时与课程同时请求
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        start_time = executor.submit(copy_context().run, semester_start_time, year_semester, token)
+        schedule_row = JwappClient(token).rows(CLASS_SCHEDULE_URL, post_data)
 
-    semester_start_time = get_start_time(token, year_semester)
-    schedule_row = resp.json()["datas"]["xskcb"]["rows"]
+        return start_time.result(), schedule_row
 
-    class_schedule = ClassSchedule()
+
+@result_cache("export_class_schedule", ttl=6 * 60 * 60, auth=IDSAuth)
+def fetch_class_schedule(
+    school_year: Optional[int] = None, semester: Optional[int] = None
+) -> ScheduleData:
+    """
+    获取生成课程表所需的全部数据，未指定学年学期时使用当前学期
+
+    :param school_year: 学年
+    :param semester: 学期
+    :return:
+    """
+
+    token = IDSAuth(SERVICE_URL)
+
+    if school_year and semester:
+        year_semester = YearSemester(school_year, semester)
+    else:
+        year_semester = latest_year_semester(token)
+
+    start_time, schedule_row = get_class_schedule_rows(token, year_semester)
+    return ScheduleData(token.username, year_semester, start_time, schedule_row)
+
+
+def course_slots(
+    semester_start_time: datetime, schedule_row: Iterable[dict]
+) -> Iterator[CourseSlot]:
+    """
+    解析 xskcb 接口返回的课程，没有任何一周上课的会被跳过
+
+    :param semester_start_time: 学期开始时间
+    :param schedule_row: xskcb 接口返回的 rows
+    """
 
     for course in schedule_row:
-        for week_count, has_course_in_week in enumerate(course["SKZC"]):
-            if has_course_in_week == "0":
-                continue
-            day_count = int(course["SKXQ"]) - 1
-            course_sequence_start = int(course["KSJC"])
-
-            course_date = semester_start_time + timedelta(week_count * 7 + day_count)
-
-            # 2020-04-23 西电发[2020]13号 统一全年作息时间
-            timetable = CLASS_TIME
-
-            course_start_time, course_end_time = timetable[course_sequence_start // 2]
-            course_start_time = course_date + clock_to_timedelta(course_start_time)
-            course_end_time = course_date + clock_to_timedelta(course_end_time)
-            course_time = course_start_time, course_end_time
-            class_schedule.add_course(
-                course_name=course["KCM"],
-                course_location=course["JASMC"] if course["JASMC"] else "待定",
-                course_time=course_time,
+        weeks = course_weeks(course["SKZC"])
+        if not weeks:
+            continue
+
+        weekday = int(course["SKXQ"]) - 1
+        # 2020-04-23 西电发[2020]13号 统一全年作息时间
+        period = int(course["KSJC"]) // 2
+        begin_offset, end_offset = CLASS_OFFSETS[period]
+
+        name = course["KCM"]
+        yield CourseSlot(
+            course.get("KCH") or name,
+            name,
+            course["JASMC"] if course["JASMC"] else "待定",
+            weekday,
+            period,
+            weeks,
+            semester_start_time + timedelta(weekday) + begin_offset,
+            end_offset - begin_offset,
+        )
+
+
+def expand_schedule(
+    semester_start_time: datetime, schedule_row: Iterable[dict]
+) -> Iterator[ClassEvent]:
+    """
+    将 xskcb 接口返回的课程展开为每一次上课
+
+    :param semester_start_time: 学期开始时间
+    :param schedule_row: xskcb 接口返回的 rows
+    :return: 按课程、周次顺序产出
+    """
+
+    for slot in course_slots(semester_start_time, schedule_row):
+        for week in slot.weeks:
+            start = slot.first_start + WEEK * week
+            yield ClassEvent(
+                slot.course_code,
+                slot.course_name,
+                slot.location,
+                week,
+                slot.weekday,
+                slot.period,
+                start,
+                start + slot.duration,
             )
 
+
+def compact_schedule(
+    semester_start_time: datetime, schedule_row: Iterable[dict]
+) -> Iterator[RecurringClass]:
+    """
+    将每门课的所有周合并为一个每周重复的事件
+
+    周次之间的间隔都是 k 的倍数时（例如单双周）使用 INTERVAL=k，其余缺课的周用 EXDATE 排除，
+    展开后与 expand_schedule 的结果完全相同
+
+    :param semester_start_time: 学期开始时间
+    :param schedule_row: xskcb 接口返回的 rows
+    """
+
+    for slot in course_slots(semester_start_time, schedule_row):
+        weeks = slot.weeks
+        first, last = weeks[0], weeks[-1]
+        interval = reduce(gcd, (b - a for a, b in zip(weeks, weeks[1:])), 0) or 1
+
+        taught = set(weeks)
+        exdates = [
+            slot.first_start + WEEK * week
+            for week in range(first, last + 1, interval)
+            if week not in taught
+        ]
+
+        start = slot.first_start + WEEK * first
+        yield RecurringClass(
+            slot.course_code,
+            slot.course_name,
+            slot.location,
+            slot.weekday,
+            slot.period,
+            weeks,
+            start,
+            start + slot.duration,
+            interval,
+            (last - first) // interval + 1,
+            exdates,
+        )
+
+
+def event_uid(semester_code: str, event: Union[ClassEvent, RecurringClass]) -> str:
+    """
+    由学期、课程、星期、节次（与周次）得到固定的 UID，重新导出时同一次课的 UID 不变
+
+    :param semester_code: 形如 '2019-2020-1' 的学年学期代号
+    :param event: 课程事件
+    :return:
+    """
+
+    key = f"{semester_code}/{event.uid_key}".encode()
+    return f"{blake2s(key, digest_size=10).hexdigest()}@oh-my-xdu"
+
+
+def event_digest(event: Union[ClassEvent, RecurringClass]) -> str:
+    """
+    事件内容的摘要，内容不变时摘要不变
+
+    :param event: 课程事件
+    :return:
+    """
+
+    from ohmyxdu.utils.ics import format_datetime
+
+    parts = [
+        event.course_name,
+        event.location,
+        format_datetime(event.start),
+        format_datetime(event.end),
+    ]
+    parts.extend(f"{name}:{value}" for name, value in event.ics_properties())
+    return blake2s("\n".join(parts).encode(), digest_size=8).hexdigest()
+
+
+def write_class_schedule(
+    ical_path: Path, events: Iterable[Union[ClassEvent, RecurringClass]], semester_code: str
+) -> ExportResult:
+    """
+    将课程写入 .ics 文件，只在与上次导出的内容不同时重写
+
+    每个事件带有固定的 UID 与内容摘要 X-OMX-DIGEST，与已有文件比较后，
+    内容变动的事件 SEQUENCE 加一，订阅该文件的日历软件只会更新这些事件
+
+    :param ical_path: 输出路径
+    :param events: expand_schedule 或 compact_schedule 的结果
+    :param semester_code: 形如 '2019-2020-1' 的学年学期代号
+    :return:
+    """
+
+    from ohmyxdu.utils.ics import ICSWriter, read_events
+
+    # 已有文件只读入比较所需的 SEQUENCE 与摘要
+    previous = read_events(ical_path, ("SEQUENCE", "X-OMX-DIGEST"))
+
+    seen: Dict[str, int] = {}
+    changed = 0
+    # 边比较边写入临时文件，没有变化时丢弃
+    with ICSWriter.open(ical_path) as writer:
+        for event in events:
+            uid = event_uid(semester_code, event)
+            # 同一时段重复出现的课程（例如分段安排的教室）按出现顺序区分
+            repeat = seen.get(uid, 0)
+            seen[uid] = repeat + 1
+            if repeat:
+                uid = f"{repeat}-{uid}"
+            digest = event_digest(event)
+            sequence = 0
+            known = previous.pop(uid, None)
+            if known is not None:
+                sequence = int(known.get("SEQUENCE", 0))
+                if known.get("X-OMX-DIGEST") != digest:
+                    sequence += 1
+                    changed += 1
+            else:
+                changed += 1
+            writer.write_event(
+                event.course_name,
+                event.location,
+                event.start,
+                event.end,
+                [
+                    ("UID", uid),
+                    ("SEQUENCE", str(sequence)),
+                    ("X-OMX-DIGEST", digest),
+                    *event.ics_properties(),
+                ],
+            )
+
+        # 剩下的是本次不再存在的事件
+        removed = len(previous)
+        if not changed and not removed:
+            writer.discard()
+
+    return ExportResult(writer.count, changed, removed, not writer.discarded)
+
+
+def build_class_schedule(
+    semester_start_time: datetime, schedule_row: List[dict], semester_code: Optional[str] = None
+) -> "ClassSchedule":
+    """
+    由 xskcb 接口返回的课程生成 icalendar 课程表
+
+    仅供需要 icalendar 对象的第三方调用，导出文件请使用 write_class_schedule
+
+    :param semester_start_time: 学期开始时间
+    :param schedule_row: xskcb 接口返回的 rows
+    :param semester_code: 学年学期代号，指定时为每个事件生成与导出文件相同的 UID
+    :return: 课程表
+    """
+
+    from ohmyxdu.utils.icalendar_helper import ClassSchedule  # icalendar 只在生成课程表时导入
+
+    class_schedule = ClassSchedule()
+
+    for event in expand_schedule(semester_start_time, schedule_row):
+        class_schedule.add_course(
+            course_name=event.course_name,
+            course_location=event.location,
+            course_time=(event.start, event.end),
+            uid=event_uid(semester_code, event) if semester_code else None,
+        )
+
     return class_schedule
 
 
+async def get_latest_year_semester_async(token) -> YearSemester:
+    """
+    get_latest_year_semester 的异步版本
+
+    :param token: ohmyxdu.auth.aio.ids.AsyncIDSAuth 令牌
+    :return:
+    """
+
+    resp = await token.get(YEAR_SEMESTER_URL)
+    return parse_year_semester(extract_rows(YEAR_SEMESTER_URL, resp.json()))
+
+
+async def get_class_schedule_async(token, year_semester: YearSemester) -> "ClassSchedule":
+    """
+    get_class_schedule 的异步版本，课程与学期开始时间会同时请求
+
+    :param token: ohmyxdu.auth.aio.ids.AsyncIDSAuth 令牌
+    :param year_semester: 学年学期
+    :return: 课程表
+    """
+
+    from asyncio import gather
+
+    post_data = {"XNXQDM": get_semester_code(year_semester)}
+
+    resp, start_time_resp = await gather(
+        token.post(CLASS_SCHEDULE_URL, data=post_data),
+        token.post(YEAR_SEMESTER_INFO_URL, data=start_time_query(year_semester)),
+    )
+
+    return build_class_schedule(
+        parse_start_time(extract_rows(YEAR_SEMESTER_INFO_URL, start_time_resp.json())),
+        extract_rows(CLASS_SCHEDULE_URL, resp.json()),
+        post_data["XNXQDM"],
+    )
+
+
 def export_class_schedule(
     *,
     save_path: Optional[Path] = None,
     school_year: Optional[int] = None,
     semester: Optional[int] = None,
+    compact: bool = False,
 ):
     """
     获取 ehall 在线课程表并转换成 .ics 课程表文件
 
+    重复导出时事件的 UID 保持不变，课程表没有变化时不会重写文件，
+    因此可以定时导出供日历软件订阅
+
     :param save_path: .ics 文件存放位置，默认为当前目录
     :param school_year: 学年，默认为当前学年
     :param semester: 学期，可为 1（上学期）或 2（下学期），默认为当前学期
+    :param compact: 每门课只生成一个每周重复的事件，文件更小，日历软件导入更快
     """
 
-    token = IDSAuth(SERVICE_URL)
-
-    if school_year and semester:
-        year_semester = YearSemester(school_year, semester)
-    else:
-        year_semester = get_latest_year_semester(token)
-    semester_code = get_semester_code(year_semester)
+    data = fetch_class_schedule(school_year, semester)
+    semester_code = get_semester_code(data.year_semester)
 
     logger.info("即将生成 {} 学年的课程表", semester_code)
-    class_schedule = get_class_schedule(token, year_semester)
 
     if not save_path:
         save_path = Path()
 
-    ical_path = save_path / f"{token.username}_{semester_code}.ics"
-    ical_path.write_bytes(class_schedule.to_ical())
+    ical_path = save_path / f"{data.username}_{semester_code}.ics"
+    expand = compact_schedule if compact else expand_schedule
+    result = write_class_schedule(
+        ical_path, expand(data.semester_start_time, data.schedule_row), semester_code
+    )
+    logger.debug(
+        "共 {} 个事件，新增或变动 {} 个，删除 {} 个", result.count, result.changed, result.removed
+    )
+    if not result.written:
+        logger.info("课程表没有变化，未重写文件")
 
+    if emit({"path": ical_path.absolute(), **result._asdict()}):
+        return
     logger.opt(colors=True).success("生成完成，保存路径为 <yellow>{}</yellow>", ical_path.absolute())
@@ -1,12 +1,103 @@
-from typing import Optional, List
-from itertools import count
-
-from loguru import logger
+from typing import Iterator, Optional, List
+from collections import deque
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 
+from ohmyxdu.log import logger
 from ohmyxdu.auth.wx import WXAuth
+from ohmyxdu.output import emit
 
 SERVICE_URL = "http://202.117.121.7:8080/oaCampus/library/getReturn.do"
 
+# 同时请求的页数
+DEFAULT_PREFETCH = 4
+
+
+def parse_books(data: dict) -> Optional[List[dict]]:
+    """
+    取出一页借书记录
+
+    :param data: getReturn 接口返回的 JSON
+    :return: 已无更多记录时为 None
+    """
+
+    if data["msgState"] != 1:
+        logger.debug("借书记录已取完: {}", data.get("msg"))
+        return None
+    logger.debug("本页 {} 条借书记录", len(data["list"]))
+    return data["list"]
+
+
+def fetch_books_page(token: WXAuth, offset: int) -> Optional[List[dict]]:
+    """
+    获取一页借书记录
+
+    :param token: 微信验证令牌
+    :param offset: 页码，从 1 开始
+    :return: 已无更多记录时为 None
+    """
+
+    return parse_books(token.post(SERVICE_URL, data={"offset": offset}).json())
+
+
+def iter_borrowed_books(
+    token: WXAuth, *, limit: Optional[int] = None, prefetch: int = DEFAULT_PREFETCH
+) -> Iterator[dict]:
+    """
+    逐条产出借书记录，按时间降序
+
+    每页条数由第一页得知，之后最多同时请求 prefetch 页；指定 limit 时只请求恰好够用的页数，
+    某页不满时即认为已到最后一页，不再多请求一次
+
+    :param token: 微信验证令牌
+    :param limit: 最多产出的条数
+    :param prefetch: 同时请求的页数
+    """
+
+    if limit is not None and limit <= 0:
+        return
+
+    first = fetch_books_page(token, 1)
+    if not first:
+        return
+
+    page_size = len(first)
+    last_offset = None if limit is None else -(-limit // page_size)
+
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+    next_offset = 2
+    count = 0
+    books = first
+    try:
+        while True:
+            for book in books:
+                yield book
+                count += 1
+                if count == limit:
+                    return
+
+            if len(books) < page_size:
+                return
+
+            # 保持最多 prefetch 个请求在途
+            while len(pending) < prefetch and (last_offset is None or next_offset <= last_offset):
+                pending.append(
+                    executor.submit(copy_context().run, fetch_books_page, token, next_offset)
+                )
+                next_offset += 1
+            if not pending:
+                return
+
+            books = pending.popleft().result()
+            if not books:
+                return
+    finally:
+        # 结束时不必等待多请求的页面
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
 
 def get_borrowed_books(*, limit: Optional[int] = None) -> List[dict]:
     """
@@ -18,18 +109,60 @@ def get_borrowed_books(*, limit: Optional[int] = None) -> List[dict]:
 
     token = WXAuth()
 
-    if limit is None:
-        limit = float("inf")
-
     books = []
-    for offset in count(1):
-        data = token.post(SERVICE_URL, data={"offset": offset}).json()
-        logger.debug(data)
-        if data["msgState"] != 1 or len(books) > limit:
-            break
-        books.extend(data["list"])
-    books = books[: min(limit, len(books))]
-    for book in books:
-        logger.success(f'应还日期:{book["returnDate"]} 《{book["title"]}》')
+    for book in iter_borrowed_books(token, limit=limit):
+        if not emit(book):
+            logger.success(f'应还日期:{book["returnDate"]} 《{book["title"]}》')
+        books.append(book)
 
     return books
+
+
+async def get_borrowed_books_async(
+    *, limit: Optional[int] = None, prefetch: int = DEFAULT_PREFETCH
+) -> List[dict]:
+    """
+    get_borrowed_books 的异步版本，只返回结果不输出
+
+    :param limit: 指定输出数量
+    :param prefetch: 同时请求的页数
+    :return: 获取到的课本信息
+    """
+
+    from asyncio import gather
+    from ohmyxdu.auth.aio.wx import AsyncWXAuth
+
+    if limit is not None and limit <= 0:
+        return []
+
+    token = await AsyncWXAuth.create()
+
+    async def fetch(offset: int) -> Optional[List[dict]]:
+        return parse_books((await token.post(SERVICE_URL, data={"offset": offset})).json())
+
+    try:
+        first = await fetch(1)
+        if not first:
+            return []
+
+        page_size = len(first)
+        last_offset = None if limit is None else -(-limit // page_size)
+
+        books = list(first)
+        offset = 2
+        finished = False
+        while not finished and (last_offset is None or offset <= last_offset):
+            end = offset + prefetch
+            if last_offset is not None:
+                end = min(end, last_offset + 1)
+
+            for page in await gather(*(fetch(o) for o in range(offset, end))):
+                books.extend(page or ())
+                if not page or len(page) < page_size:
+                    finished = True
+                    break
+            offset = end
+    finally:
+        await token.aclose()
+
+    return books if limit is None else books[:limit]
@@ -1,5 +1,19 @@
-from loguru import logger
+from ohmyxdu.log import logger
 from ohmyxdu.auth.wx import WXAuth
+from ohmyxdu.output import emit
+
+SERVICE_URL = "http://202.117.121.7:8080/infoCampus/playCampus/getAllPurposeCard.do"
+
+
+def parse_card_balance(data: dict) -> int:
+    """
+    取出校园卡余额
+
+    :param data: getAllPurposeCard 接口返回的 JSON
+    :return: 校园卡余额，以分为单位
+    """
+
+    return int(data["allPurposeCardVO"]["cardGeneralInfo"][0]["value"])
 
 
 def get_card_balance() -> int:
@@ -11,9 +25,28 @@ def get_card_balance() -> int:
 
     token = WXAuth()
 
-    resp = token.post("http://202.117.121.7:8080/infoCampus/playCampus/getAllPurposeCard.do")
+    resp = token.post(SERVICE_URL)
+
+    wallet = parse_card_balance(resp.json())
+    if not emit({"balance": wallet}):
+        logger.success(f"一卡通余额:￥{wallet / 100:.2f}")
+
+    return wallet
+
+
+async def get_card_balance_async() -> int:
+    """
+    get_card_balance 的异步版本，只返回结果不输出
+
+    :return: 校园卡余额，以分为单位
+    """
+
+    from ohmyxdu.auth.aio.wx import AsyncWXAuth
 
-    wallet = resp.json()["allPurposeCardVO"]["cardGeneralInfo"][0]["value"]
-    logger.success(f"一卡通余额:￥{int(wallet) / 100:.2f}")
+    token = await AsyncWXAuth.create()
+    try:
+        resp = await token.post(SERVICE_URL)
+    finally:
+        await token.aclose()
 
-    return int(wallet)
+    return parse_card_balance(resp.json())
@@ -1,10 +1,12 @@
-from typing import Optional, NamedTuple, List, DefaultDict
-from json import dumps
+from typing import Optional, NamedTuple, Iterable, List, DefaultDict, Union
 from collections import defaultdict
 
-from loguru import logger
-
+from ohmyxdu.log import logger
 from ohmyxdu.auth.ids import IDSAuth
+from ohmyxdu.cache import result_cache
+from ohmyxdu.output import emit_many
+from ohmyxdu.utils.grade_store import GradeChange, get_grade_store
+from ohmyxdu.utils.jwapp import JwappClient, Query, fetch_all_async
 
 BASE_URL = "http://ehall.xidian.edu.cn"
 SERVICE_URL = BASE_URL + "/appShow?appId=4768574631264620"
@@ -17,41 +19,128 @@ class Grade(NamedTuple):
     grade_point: Optional[float]
 
 
-def get_grade(*, year_semester: Optional[str] = None) -> DefaultDict[str, List[Grade]]:
+def grade_query(year_semester: Optional[str] = None) -> Query:
     """
-    获取指定学年成绩，默认获取所有
+    构造成绩查询条件
 
-    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期
+    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期，为空时查询所有
+    :return: 查询条件
     """
 
-    token = IDSAuth(SERVICE_URL)
-    query = []
+    query = Query()
 
     if year_semester:
-        # TODO: query builder
-        query.append(
-            {"name": "XNXQDM", "value": year_semester, "linkOpt": "and", "builder": "m_value_equal"}
-        )
+        query.equal("XNXQDM", year_semester)
+
+    return query.order_by("KCH", "KXH")  # 按课程号，课序号排序
 
-    data = {
-        "querySetting": dumps(query),
-        "*order": "KCH,KXH",  # 按课程名，课程号排序
-        "pageSize": 1000,  # 有多少整多少.jpg
-        "pageNumber": 1,
-    }
 
-    resp = token.post(GRADE_URL, data=data)
+def parse_grades(courses: Iterable[dict]) -> DefaultDict[str, List[Grade]]:
+    """
+    按学年学期整理成绩
 
-    courses = resp.json()["datas"]["xscjcx"]["rows"]
+    :param courses: xscjcx 接口返回的 rows，可以是边下载边产出的迭代器
+    :return:
+    """
 
-    grades = defaultdict(lambda: [])
+    grades = defaultdict(list)
+    # 每门课一行，判断一次即可
+    debug = logger.enabled("DEBUG")
 
     for course in courses:
-        logger.debug(course)
+        if debug:
+            logger.debug("{}", course)
         grades[course["XNXQDM_DISPLAY"]].append(
             Grade(course["XSKCM"], course["ZCJ"], course["XFJD"])
         )
 
+    return grades
+
+
+@result_cache("get_grade", ttl=10 * 60, auth=IDSAuth)
+def fetch_grades(year_semester: Optional[str] = None) -> DefaultDict[str, List[Grade]]:
+    """
+    获取指定学年成绩，默认获取所有，不输出
+
+    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期
+    """
+
+    token = IDSAuth(SERVICE_URL)
+
+    return parse_grades(JwappClient(token).iter(GRADE_URL, grade_query(year_semester)))
+
+
+def current_year_semester() -> str:
+    """
+    当前学年学期，来自课程表应用，所有用户共用缓存
+
+    :return: 形如 '2019-2020-1' 的学年学期代号
+    """
+
+    from ohmyxdu.utils.semester import get_semester_code, latest_year_semester
+
+    # 命中缓存时不必登录课程表应用
+    return get_semester_code(latest_year_semester())
+
+
+def sync_grades(year_semester: Optional[str] = None) -> List[GradeChange]:
+    """
+    只拉取一个学期的成绩，与本地成绩存储比较并更新
+
+    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期，默认为当前学期
+    :return: 新出或变动的成绩，首次同步时为该学期的全部成绩
+    """
+
+    store = get_grade_store()
+    if store is None:
+        raise RuntimeError("同步成绩需要保存到本地，OMX 未指定数据目录")
+
+    token = IDSAuth(SERVICE_URL)
+    if year_semester is None:
+        year_semester = current_year_semester()
+
+    rows = JwappClient(token).iter(GRADE_URL, grade_query(year_semester))
+
+    return store.sync(token.username, rows, year_semester)
+
+
+def get_grade(
+    *, year_semester: Optional[str] = None, sync: bool = False
+) -> Union[DefaultDict[str, List[Grade]], List[GradeChange]]:
+    """
+    获取指定学年成绩，默认获取所有
+
+    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期
+    :param sync: 只同步一个学期（默认为当前学期），仅输出与上次同步相比新出或变动的成绩，适合定时轮询
+    """
+
+    if sync:
+        changes = sync_grades(year_semester)
+        if emit_many(
+            {**grade._asdict(), "previous_score": None if previous is None else previous.score}
+            for grade, previous in changes
+        ):
+            return changes
+
+        for grade, previous in changes:
+            if previous is None:
+                logger.success(f"[新成绩] {grade.year_semester} {grade.course_name}:{grade.score}")
+            else:
+                logger.success(
+                    f"[成绩变动] {grade.year_semester} {grade.course_name}:"
+                    f"{previous.score} -> {grade.score}"
+                )
+        return changes
+
+    grades = fetch_grades(year_semester)
+
+    if emit_many(
+        {"year_semester": semester, **grade._asdict()}
+        for semester, semester_grades in grades.items()
+        for grade in semester_grades
+    ):
+        return grades
+
     for year_semester in grades.keys():
         logger.success(f"{year_semester}:")
         for grade in grades[year_semester]:
@@ -61,3 +150,21 @@ def get_grade(*, year_semester: Optional[str] = None) -> DefaultDict[str, List[G
                 logger.success(f"\t{grade.course_name}:{grade.score}")
 
     return grades
+
+
+async def get_grade_async(*, year_semester: Optional[str] = None) -> DefaultDict[str, List[Grade]]:
+    """
+    get_grade 的异步版本，只返回结果不输出
+
+    :param year_semester: 例如："2019-2020-1" 为2019学年第一学期
+    """
+
+    from ohmyxdu.auth.aio.ids import AsyncIDSAuth
+
+    token = await AsyncIDSAuth.create(SERVICE_URL)
+    try:
+        rows = await fetch_all_async(token, GRADE_URL, grade_query(year_semester))
+    finally:
+        await token.aclose()
+
+    return parse_grades(rows)
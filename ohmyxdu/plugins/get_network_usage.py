@@ -1,9 +1,13 @@
-from typing import List, NamedTuple
+from typing import Any, List, NamedTuple
 
-from loguru import logger
 from parsel import Selector
 
 from ohmyxdu.auth.zfw import ZFWAuth
+from ohmyxdu.cache import result_cache
+from ohmyxdu.log import logger
+from ohmyxdu.output import emit_many
+
+SERVICE_URL = "https://zfw.xidian.edu.cn/home"
 
 
 class Package(NamedTuple):
@@ -15,26 +19,69 @@ class Package(NamedTuple):
     expires_day: str
 
 
-def get_network_usage() -> List[Package]:
+def _parse_packages(html: Selector) -> List[Package]:
+    packages = []
+    for package_tag in html.css("#w3-container>table>tbody>tr"):
+        packages.append(Package(*[tag.get() for tag in package_tag.css("td::text")]))
+    return packages
+
+
+def parse_packages(html_text: str) -> List[Package]:
     """
-    获取校园网流量使用情况
+    从自服务首页解析流量包信息
 
+    :param html_text: 自服务首页
     :return: 流量包信息
     """
 
-    token = ZFWAuth()
+    return _parse_packages(Selector(html_text))
+
+
+def parse_home_page(resp: Any) -> List[Package]:
+    """
+    检查自服务首页的响应并解析流量包信息
+
+    拿到的不是首页时抛出异常而不是返回空结果，以免失败的结果被缓存，
+    没有流量包的账号仍返回空列表
 
-    resp = token.get("https://zfw.xidian.edu.cn/home")
+    :param resp: requests 或 httpx 的响应
+    :return: 流量包信息
+    """
 
-    if resp.status_code != 200:
-        logger.error("登录失败，尝试检查网络连接与账号密码")
+    # 登录失败时首页会跳转回登录页，状态码仍为 200
+    if resp.status_code != 200 or resp.history:
+        raise ConnectionError("登录失败，尝试检查网络连接与账号密码")
 
     html = Selector(resp.text)
-    package_tags = html.css("#w3-container>table>tbody>tr")
+    # 没有流量包时首页仍有 #w3-container，没有它说明拿到的是登录页
+    if not html.css("#w3-container"):
+        raise ConnectionError("登录失败，尝试检查网络连接与账号密码")
+    return _parse_packages(html)
 
-    packages = []
-    for package_tag in package_tags:
-        packages.append(Package(*[tag.get() for tag in package_tag.css("td::text")]))
+
+@result_cache("get_network_usage", ttl=5 * 60, auth=ZFWAuth)
+def fetch_packages() -> List[Package]:
+    """
+    获取校园网流量使用情况，不输出
+
+    :return: 流量包信息
+    """
+
+    token = ZFWAuth()
+
+    return parse_home_page(token.get(SERVICE_URL))
+
+
+def get_network_usage() -> List[Package]:
+    """
+    获取校园网流量使用情况
+
+    :return: 流量包信息
+    """
+
+    packages = fetch_packages()
+    if emit_many(packages):
+        return packages
 
     for package in packages:
         logger.opt(colors=True).success(
@@ -47,3 +94,21 @@ def get_network_usage() -> List[Package]:
             *package,
         )
     return packages
+
+
+async def get_network_usage_async() -> List[Package]:
+    """
+    get_network_usage 的异步版本，只返回结果不输出
+
+    :return: 流量包信息
+    """
+
+    from ohmyxdu.auth.aio.zfw import AsyncZFWAuth
+
+    token = await AsyncZFWAuth.create()
+    try:
+        resp = await token.get(SERVICE_URL)
+    finally:
+        await token.aclose()
+
+    return parse_home_page(resp)
@@ -0,0 +1,159 @@
+"""
+性能剖析
+
+omx --profile <command> 会在 ~/.omx/profile 下为每次运行生成三个文件:
+<时间>-<命令>.pstats: cProfile 结果（仅主线程），可用 python -m pstats 或 snakeviz 查看
+<时间>-<命令>.collapsed: 定时采样所有线程得到的折叠调用栈，可交给 flamegraph.pl 或 speedscope 渲染
+<时间>-<命令>.imports.txt: 在子进程中用 -X importtime 重新导入本次用到的模块，按累计耗时排序
+"""
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import run, PIPE
+from threading import Event, Thread, enumerate as enumerate_threads
+from time import strftime
+
+from ohmyxdu.log import logger
+
+__all__ = ("StackSampler", "parse_importtime", "import_breakdown", "profile")
+
+
+class StackSampler(Thread):
+    """
+    定时采样所有线程的调用栈
+
+    与 cProfile 不同，采样保留了完整的调用链，并且能覆盖批量执行时的工作线程
+
+    :param interval: 采样间隔（秒）
+    """
+
+    def __init__(self, interval: float = 0.001):
+        super().__init__(name="omx-stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in enumerate_threads()}
+            for ident, frame in frames.items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def dump(self, path: Path):
+        """
+        以 flamegraph.pl 使用的折叠格式写入，每行为 "调用栈 采样数"
+
+        :param path: 输出路径
+        """
+
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.items()))
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int, int]]:
+    """
+    解析 -X importtime 的输出
+
+    :return: 模块名到 (自身耗时, 累计耗时, 缩进层级) 的映射，单位为微秒
+    >>> parse_importtime('import time: self [us] | cumulative | imported package\\n'
+    ...                  'import time:       120 |        300 |   toml.decoder\\n'
+    ...                  'import time:        80 |        380 | toml')
+    {'toml.decoder': (120, 300, 1), 'toml': (80, 380, 0)}
+    """
+
+    r = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        r[name.strip()] = (int(self_us), int(cumulative_us), level)
+    return r
+
+
+def import_breakdown(modules: Sequence[str]) -> Dict[str, Tuple[int, int, int]]:
+    """
+    在新的解释器中导入指定模块并统计各模块的导入耗时
+
+    :param modules: 模块名，例如 ['ohmyxdu.console', 'ohmyxdu.plugins.get_grade']
+    :return: 同 parse_importtime
+    """
+
+    code = "; ".join(f"import {module}" for module in modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    result = run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        stdout=PIPE,
+        stderr=PIPE,
+        universal_newlines=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def _write_import_breakdown(modules: Sequence[str], path: Path):
+    costs = import_breakdown(modules)
+
+    lines: List[str] = [f"{'self [ms]':>10} {'cumulative [ms]':>16}  module"]
+    for name, (self_us, cumulative_us, level) in sorted(
+        costs.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        indent = "  " * level
+        lines.append(f"{self_us / 1000:>10.2f} {cumulative_us / 1000:>16.2f}  {indent}{name}")
+
+    top_level = sum(cumulative for _, cumulative, level in costs.values() if level == 0)
+    lines.append(f"\n合计 {top_level / 1000:.2f} ms（含 Python 启动时的导入）")
+    path.write_text("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profile(output_dir: Path, command: str, modules: Sequence[str] = ()) -> Iterator[Path]:
+    """
+    剖析 with 块内的执行过程，退出时（包括出错时）写入结果
+
+    :param output_dir: 输出目录，不存在时自动创建
+    :param command: 命令名，用于文件名
+    :param modules: 需要统计导入耗时的模块，为空时不统计
+    :return: 不含扩展名的输出路径前缀
+    """
+
+    import cProfile
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    prefix = output_dir / f"{strftime('%Y%m%d-%H%M%S')}-{command}"
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+
+    sampler.start()
+    profiler.enable()
+    try:
+        yield prefix
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+        profiler.dump_stats(str(prefix.with_suffix(".pstats")))
+        sampler.dump(prefix.with_suffix(".collapsed"))
+        if modules:
+            _write_import_breakdown(modules, prefix.with_suffix(".imports.txt"))
+
+        logger.info("性能剖析结果已保存至 {}.*", prefix)
@@ -1,44 +1,94 @@
 from uuid import getnode
+from functools import lru_cache
 from hashlib import blake2s
 from secrets import token_bytes
 from base64 import b64encode, b64decode
 
-from loguru import logger
-from Crypto.Cipher import ChaCha20_Poly1305
-from Crypto.Util.Padding import pad, unpad
+from ohmyxdu.log import logger
 
+# pycryptodome 只在真正加解密时导入
 
-def kdf(base: bytes) -> bytes:
+
+@lru_cache(maxsize=None)
+def machine_key() -> bytes:
     """
-    密钥派生 (Key Derivation Function)
+    本机密钥，由 MAC 地址生成
+
+    getnode 在部分系统上需要调用外部命令或遍历网卡，因此整个进程只获取一次
 
-    :param base: 任意长字节串
     :return: 长度为32的字节串
     """
 
     mac = getnode()
     if (mac >> 40) & 1:
         logger.warning("似乎无法获取计算机MAC地址，密码验证可能会失败")
-    return blake2s(base, key=mac.to_bytes(32, "big")).digest()
+    return mac.to_bytes(32, "big")
 
 
-def encode_password(plain_password: str, username: str) -> str:
+@lru_cache(maxsize=None)
+def kdf(base: bytes) -> bytes:
     """
-    加密本地密码
+    密钥派生 (Key Derivation Function)
 
-    :param plain_password: 明文密码
+    结果只与输入和本机有关，进程内会缓存
+
+    :param base: 任意长字节串
+    :return: 长度为32的字节串
+    """
+
+    return blake2s(base, key=machine_key()).digest()
+
+
+def encode_data(plain_data: bytes, username: str) -> bytes:
+    """
+    加密本地数据，密钥由用户名与本机派生
+
+    :param plain_data: 明文数据
     :param username: 用户名
-    :return:
+    :return: nonce + 密文 + MAC
     """
 
+    from Crypto.Cipher import ChaCha20_Poly1305
+
     key = kdf(username.encode())
-    plain_password = plain_password.encode()
     nonce = token_bytes(12)
 
     box = ChaCha20_Poly1305.new(key=key, nonce=nonce)
-    cipher = box.encrypt_and_digest(pad(plain_password, block_size=32))
-    r = nonce + cipher[0] + cipher[1]
+    cipher, mac = box.encrypt_and_digest(plain_data)
 
+    return nonce + cipher + mac
+
+
+def decode_data(cipher_data: bytes, username: str) -> bytes:
+    """
+    解密本地数据
+
+    :param cipher_data: 由 encode_data 加密的数据
+    :param username: 用户名
+    :return: 明文数据
+    """
+
+    from Crypto.Cipher import ChaCha20_Poly1305
+
+    key = kdf(username.encode())
+    nonce, cipher, mac = cipher_data[:12], cipher_data[12:-16], cipher_data[-16:]
+
+    box = ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    return box.decrypt_and_verify(cipher, mac)
+
+
+def encode_password(plain_password: str, username: str) -> str:
+    """
+    加密本地密码
+
+    :param plain_password: 明文密码
+    :param username: 用户名
+    :return:
+    """
+
+    from Crypto.Util.Padding import pad
+
+    r = encode_data(pad(plain_password.encode(), block_size=32), username)
     return b64encode(r).decode()
 
 
@@ -51,13 +101,9 @@ def decode_password(cipher_password: str, username: str) -> str:
     :return:
     """
 
-    key = kdf(username.encode())
-    cipher_password = b64decode(cipher_password)
-    nonce, cipher, mac = cipher_password[:12], cipher_password[12:-16], cipher_password[-16:]
-
-    box = ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    from Crypto.Util.Padding import unpad
 
     try:
-        return unpad(box.decrypt_and_verify(cipher, mac), block_size=32).decode()
+        return unpad(decode_data(b64decode(cipher_password), username), block_size=32).decode()
     except ValueError:
         raise ValueError("存储密码解密失败，需要重新输入密码")
@@ -0,0 +1,141 @@
+"""
+本地成绩存储
+
+以 (学年学期, 课程号) 为键保存已知的成绩，同步时只需比较新拉取的学期，即可得到新出或变动的成绩。
+每个用户一个文件，与会话一样加密存储在数据目录下。
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+from json import dumps, loads
+from time import time
+from hashlib import blake2s
+from secrets import token_hex
+from pathlib import Path
+
+from ohmyxdu.log import logger
+from ohmyxdu.globals import get_current_omx
+from ohmyxdu.security import encode_data, decode_data
+
+__all__ = ("StoredGrade", "GradeChange", "GradeStore", "get_grade_store")
+
+
+class StoredGrade(NamedTuple):
+    year_semester: str
+    course_code: str
+    course_name: str
+    score: Any  # 可能是数字，也可能是“优秀”之类的等级
+    grade_point: Optional[float]
+
+    @property
+    def key(self) -> str:
+        return f"{self.year_semester}/{self.course_code}"
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "StoredGrade":
+        """
+        :param row: xscjcx 接口返回的一行
+        """
+
+        return cls(
+            row["XNXQDM"],
+            row.get("KCH") or row["XSKCM"],  # 个别课程没有课程号，退而使用课程名
+            row["XSKCM"],
+            row["ZCJ"],
+            row["XFJD"],
+        )
+
+
+class GradeChange(NamedTuple):
+    grade: StoredGrade
+    previous: Optional[StoredGrade]  # 新出的成绩为 None
+
+
+class GradeStore:
+    """加密的成绩存储，文件名为用户名的摘要"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _file(self, username: str) -> Path:
+        name = blake2s(username.encode(), digest_size=16).hexdigest()
+        return self.path / f"{name}.grades"
+
+    def load(self, username: str) -> Dict[str, StoredGrade]:
+        """
+        :param username: 用户名
+        :return: 键为 StoredGrade.key，不存在或无法解密时为空
+        """
+
+        grade_file = self._file(username)
+        try:
+            plain = decode_data(grade_file.read_bytes(), username)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.debug("成绩文件 {} 无法解密，已忽略", grade_file)
+            return {}
+
+        return {g.key: g for g in (StoredGrade(*item) for item in loads(plain)["grades"])}
+
+    def save(self, username: str, grades: Iterable[StoredGrade]):
+        plain = dumps({"saved_at": time(), "grades": [list(g) for g in grades]})
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        grade_file = self._file(username)
+        tmp_file = grade_file.with_suffix(f".{token_hex(4)}.tmp")
+        tmp_file.write_bytes(encode_data(plain.encode(), username))
+        tmp_file.replace(grade_file)
+
+    def sync(
+        self, username: str, rows: Iterable[Dict[str, Any]], year_semester: Optional[str] = None
+    ) -> List[GradeChange]:
+        """
+        用新拉取的成绩更新存储
+
+        :param username: 用户名
+        :param rows: xscjcx 接口返回的 rows
+        :param year_semester: 本次拉取的学年学期，为空表示拉取了全部学期；
+                              该范围内在存储中有、本次却没有的成绩会被删除
+        :return: 新出或变动的成绩
+        """
+
+        known = self.load(username)
+        fetched = {g.key: g for g in map(StoredGrade.from_row, rows)}
+
+        changes = [
+            GradeChange(grade, known.get(key))
+            for key, grade in fetched.items()
+            if known.get(key) != grade
+        ]
+
+        removed = [
+            key
+            for key, grade in known.items()
+            if key not in fetched
+            and (year_semester is None or grade.year_semester == year_semester)
+        ]
+
+        if changes or removed:
+            for key in removed:
+                del known[key]
+            known.update(fetched)
+            self.save(username, known.values())
+
+        return changes
+
+
+def get_grade_store() -> Optional[GradeStore]:
+    """
+    获取当前 OMX 对应的成绩存储
+
+    :return: OMX 未指定数据目录时返回 None
+    """
+
+    try:
+        data_path = get_current_omx().data_path
+    except LookupError:
+        return None
+
+    if data_path is None:
+        return None
+    return GradeStore(data_path / "grades")
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Optional, Tuple
 from datetime import datetime
 
 from icalendar import Calendar, Event
@@ -8,9 +8,15 @@ __all__ = ("ClassSchedule",)
 
 class ClassSchedule(Calendar):
     def add_course(
-        self, course_name: str, course_location: str, course_time: Tuple[datetime, datetime]
+        self,
+        course_name: str,
+        course_location: str,
+        course_time: Tuple[datetime, datetime],
+        uid: Optional[str] = None,
     ):
         event = Event()
+        if uid is not None:
+            event.add("uid", uid)
         event.add("summary", course_name)
         event.add("location", course_location)
         event.add("dtstart", course_time[0])
@@ -0,0 +1,228 @@
+"""
+流式 iCalendar 写入
+
+课程表中的事件结构固定，不需要 icalendar 的完整对象模型。
+ICSWriter 逐个写出 VEVENT，内存占用与事件数量无关，输出格式与 icalendar 生成的一致，用法:
+with ICSWriter.open(Path("schedule.ics")) as writer:
+    writer.write_event("高等数学", "B-101", start, end)
+"""
+
+from typing import IO, Collection, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from secrets import token_hex
+
+__all__ = (
+    "ICSWriter",
+    "escape_text",
+    "fold_line",
+    "format_datetime",
+    "unfold_lines",
+    "read_events",
+)
+
+PRODID = "-//oh-my-xdu//ohmyxdu//ZH"
+
+
+def escape_text(text: str) -> str:
+    r"""
+    转义 TEXT 类型的值
+
+    >>> escape_text('a,b;c\\d\ne')
+    'a\\,b\\;c\\\\d\\ne'
+    """
+
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str, limit: int = 75) -> str:
+    """
+    按 RFC 5545 折行，每行不超过 limit 个字节，且不会拆开多字节字符
+
+    >>> fold_line('SUMMARY:' + 'a' * 70)
+    'SUMMARY:aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa\\r\\n aaa'
+    """
+
+    if len(line) <= limit // 4 or len(line.encode()) <= limit:
+        return line
+
+    parts = []
+    start = 0
+    size = 0
+    for i, char in enumerate(line):
+        char_size = len(char.encode())
+        # 续行开头的空格也占一个字节
+        if size + char_size > (limit if not parts else limit - 1):
+            parts.append(line[start:i])
+            start = i
+            size = 0
+        size += char_size
+    parts.append(line[start:])
+    return "\r\n ".join(parts)
+
+
+def format_datetime(dt: datetime) -> str:
+    """
+    浮动时间（不带时区），与课程表中的 naive datetime 对应
+
+    >>> format_datetime(datetime(2020, 8, 31, 8, 30))
+    '20200831T083000'
+    """
+
+    return (
+        f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
+    )
+
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    fold_line 的逆操作，可直接传入打开的文件，逐行读取
+
+    >>> list(unfold_lines(['SUMMARY:aa\\r\\n', ' a\\r\\n', 'END:VEVENT\\r\\n']))
+    ['SUMMARY:aaa', 'END:VEVENT']
+    """
+
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def read_events(
+    path: Path, names: Optional[Collection[str]] = None
+) -> Dict[str, Dict[str, str]]:
+    """
+    逐行读取已有 .ics 文件中各事件的属性，只用于和新生成的内容比较，属性值保持原样不反转义
+
+    :param path: .ics 文件
+    :param names: 只保留这些属性（UID 总会保留），为空时保留全部
+    :return: {UID: {属性名（不含参数）: 值}}，没有 UID 的事件会被忽略，文件不存在时为空
+    """
+
+    try:
+        file = path.open(encoding="utf-8", newline="")
+    except FileNotFoundError:
+        return {}
+
+    events = {}
+    event = None
+    with file:
+        for line in unfold_lines(file):
+            if line == "BEGIN:VEVENT":
+                event = {}
+            elif line == "END:VEVENT":
+                if event and "UID" in event:
+                    events[event["UID"]] = event
+                event = None
+            elif event is not None:
+                name, _, value = line.partition(":")
+                name = name.split(";", 1)[0].upper()
+                if names is None or name == "UID" or name in names:
+                    event[name] = value
+    return events
+
+
+class ICSWriter:
+    """
+    向文本流逐个写出事件
+
+    :param stream: 以 newline='' 打开的文本流，换行由写入器负责
+    :param dtstamp: 各事件的 DTSTAMP，需为 UTC 时间，默认为当前时间
+    """
+
+    def __init__(self, stream: IO[str], dtstamp: Optional[datetime] = None):
+        self.stream = stream
+        self.count = 0
+        self.discarded = False
+        # RFC 5545 要求每个 VEVENT 都有 DTSTAMP，同一次写出的事件共用
+        if dtstamp is None:
+            dtstamp = datetime.now(timezone.utc)
+        self.dtstamp = format_datetime(dtstamp) + "Z"
+
+    @classmethod
+    @contextmanager
+    def open(
+        cls, path: Path, properties: Sequence[Tuple[str, str]] = ()
+    ) -> Iterator["ICSWriter"]:
+        """
+        写入文件，先写临时文件，完成后再替换，出错或调用了 discard 时原文件保持不变
+
+        :param path: 输出路径
+        :param properties: 额外的日历属性，例如 [('X-WR-CALNAME', '课程表')]
+        """
+
+        tmp_path = path.with_name(f".{path.name}.{token_hex(4)}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8", newline="") as stream:
+                writer = cls(stream)
+                writer.begin(properties)
+                yield writer
+                writer.end()
+            if not writer.discarded:
+                tmp_path.replace(path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def discard(self):
+        """放弃已写出的内容，由 open 打开时不会替换原文件"""
+
+        self.discarded = True
+
+    def _line(self, line: str):
+        self.stream.write(fold_line(line))
+        self.stream.write("\r\n")
+
+    def begin(self, properties: Sequence[Tuple[str, str]] = ()):
+        self._line("BEGIN:VCALENDAR")
+        self._line("VERSION:2.0")
+        self._line(f"PRODID:{PRODID}")
+        for name, value in properties:
+            self._line(f"{name}:{escape_text(value)}")
+
+    def end(self):
+        self._line("END:VCALENDAR")
+
+    def write_event(
+        self,
+        summary: str,
+        location: str,
+        start: datetime,
+        end: datetime,
+        properties: Sequence[Tuple[str, str]] = (),
+    ):
+        """
+        写出一个事件
+
+        :param summary: 标题
+        :param location: 地点
+        :param start: 开始时间
+        :param end: 结束时间
+        :param properties: 额外的属性，值需已按其类型编码，例如 [('UID', '...'), ('SEQUENCE', '1')]
+        """
+
+        line = self._line
+        line("BEGIN:VEVENT")
+        line(f"DTSTAMP:{self.dtstamp}")
+        line(f"SUMMARY:{escape_text(summary)}")
+        line(f"DTSTART;VALUE=DATE-TIME:{format_datetime(start)}")
+        line(f"DTEND;VALUE=DATE-TIME:{format_datetime(end)}")
+        line(f"LOCATION:{escape_text(location)}")
+        for name, value in properties:
+            line(f"{name}:{value}")
+        line("END:VEVENT")
+        self.count += 1
@@ -0,0 +1,223 @@
+"""
+ehall jwapp 应用的查询接口
+
+ehall 上的教务应用（成绩、课表等）共用同一套接口：POST 表单，返回 {"datas": {<接口名>: {"rows": [...]}}}，
+可分页的接口还会返回 totalSize。
+client = JwappClient(IDSAuth(SERVICE_URL))
+query = Query().equal("XNXQDM", "2019-2020-1").order_by("KCH", "KXH")
+for row in client.iter(GRADE_URL, query):
+    print(row["XSKCM"])
+"""
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from json import dumps
+from collections import deque
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+
+from ohmyxdu.log import logger
+
+__all__ = ("Query", "Page", "JwappClient", "extract_rows", "fetch_all_async")
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_PREFETCH = 4
+
+
+class Query:
+    """
+    querySetting 构造器，方法均返回自身，可链式调用
+
+    >>> Query().equal('XNXQDM', '2019-2020-1').order_by('KCH', '-KXH').form()
+    {'querySetting': '[{"name": "XNXQDM", "value": "2019-2020-1", "linkOpt": "and", \
+"builder": "m_value_equal"}]', '*order': 'KCH,-KXH'}
+    """
+
+    def __init__(self):
+        self.conditions: List[Dict[str, Any]] = []
+        self.order: List[str] = []
+
+    def where(self, name: str, value: Any, builder: str, link: str = "and") -> "Query":
+        """
+        添加任意条件
+
+        :param name: 字段名
+        :param value: 值
+        :param builder: 比较方式，例如 m_value_equal、include
+        :param link: 与前一个条件的关系，and 或 or
+        """
+
+        self.conditions.append({"name": name, "value": value, "linkOpt": link, "builder": builder})
+        return self
+
+    def equal(self, name: str, value: Any, link: str = "and") -> "Query":
+        return self.where(name, value, "m_value_equal", link)
+
+    def not_equal(self, name: str, value: Any, link: str = "and") -> "Query":
+        return self.where(name, value, "m_value_not_equal", link)
+
+    def include(self, name: str, value: Any, link: str = "and") -> "Query":
+        """模糊匹配"""
+
+        return self.where(name, value, "include", link)
+
+    def order_by(self, *fields: str) -> "Query":
+        """
+        :param fields: 字段名，默认升序，前缀 - 为降序
+        """
+
+        self.order.extend(fields)
+        return self
+
+    def form(self, page_size: Optional[int] = None, page_number: Optional[int] = None) -> dict:
+        """
+        :param page_size: 每页条数，为空时不分页
+        :param page_number: 页码，从 1 开始
+        :return: 可直接 POST 的表单
+        """
+
+        data: Dict[str, Any] = {"querySetting": dumps(self.conditions)}
+        if self.order:
+            data["*order"] = ",".join(self.order)
+        if page_size is not None:
+            data["pageSize"] = page_size
+            data["pageNumber"] = page_number or 1
+        return data
+
+
+class Page(NamedTuple):
+    rows: List[Dict[str, Any]]
+    total: int
+
+
+def extract_rows(url: str, data: dict) -> List[Dict[str, Any]]:
+    """
+    从接口返回的 JSON 中取出 rows
+
+    :param url: 接口 URL，文件名即数据集名，例如 .../xscjcx.do 对应 xscjcx
+    :param data: 接口返回的 JSON
+    :return:
+    """
+
+    return data["datas"][_dataset(url)]["rows"]
+
+
+def _dataset(url: str) -> str:
+    return url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+def _page(url: str, data: dict) -> Page:
+    dataset = data["datas"][_dataset(url)]
+    return Page(dataset["rows"], int(dataset.get("totalSize", len(dataset["rows"]))))
+
+
+class JwappClient:
+    """
+    在已登录的 IDSAuth 上查询 jwapp 接口
+
+    :param token: 已通过对应应用 service_url 验证的 IDSAuth
+    :param page_size: 分页查询时每页条数
+    :param prefetch: 分页查询时同时请求的页数，也是最多缓存的页数
+    """
+
+    def __init__(
+        self, token, *, page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = DEFAULT_PREFETCH
+    ):
+        self.token = token
+        self.page_size = page_size
+        self.prefetch = prefetch
+
+    def request(self, url: str, data: Optional[dict] = None) -> dict:
+        """
+        请求接口，有表单时 POST，否则 GET
+
+        :return: 接口返回的 JSON
+        """
+
+        if data is None:
+            return self.token.get(url).json()
+        return self.token.post(url, data=data).json()
+
+    def rows(self, url: str, data: Optional[dict] = None) -> List[Dict[str, Any]]:
+        """请求不分页的接口，返回 rows"""
+
+        return extract_rows(url, self.request(url, data))
+
+    def page(self, url: str, query: Query, number: int) -> Page:
+        """
+        请求一页
+
+        :param number: 页码，从 1 开始
+        """
+
+        return _page(url, self.request(url, query.form(self.page_size, number)))
+
+    def iter(self, url: str, query: Optional[Query] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐行产出全部结果
+
+        第一页返回后才知道总页数，之后最多同时请求 prefetch 页，按页码顺序产出，
+        内存中最多只有 prefetch 页的数据
+
+        :param url: 接口 URL
+        :param query: 查询条件，为空时查询全部
+        """
+
+        if query is None:
+            query = Query()
+
+        first = self.page(url, query, 1)
+        yield from first.rows
+
+        pages = -(-first.total // self.page_size)
+        if pages <= 1:
+            return
+        logger.debug("{} 共 {} 条，{} 页", _dataset(url), first.total, pages)
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            pending = deque()
+            next_number = 2
+            try:
+                while next_number <= pages or pending:
+                    while next_number <= pages and len(pending) < self.prefetch:
+                        # 带上当前上下文，请求统计等仍能知道所属的插件
+                        pending.append(
+                            executor.submit(copy_context().run, self.page, url, query, next_number)
+                        )
+                        next_number += 1
+                    yield from pending.popleft().result().rows
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def fetch_all(self, url: str, query: Optional[Query] = None) -> List[Dict[str, Any]]:
+        return list(self.iter(url, query))
+
+
+async def fetch_all_async(
+    token, url: str, query: Optional[Query] = None, page_size: int = DEFAULT_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """
+    JwappClient.fetch_all 的异步版本，第一页之后的所有页同时请求
+
+    :param token: ohmyxdu.auth.aio.ids.AsyncIDSAuth 令牌
+    :param url: 接口 URL
+    :param query: 查询条件，为空时查询全部
+    :param page_size: 每页条数
+    """
+
+    from asyncio import gather
+
+    if query is None:
+        query = Query()
+
+    async def page(number: int) -> Page:
+        resp = await token.post(url, data=query.form(page_size, number))
+        return _page(url, resp.json())
+
+    first = await page(1)
+    rest = await gather(*(page(n) for n in range(2, -(-first.total // page_size) + 1)))
+
+    rows = list(first.rows)
+    for p in rest:
+        rows.extend(p.rows)
+    return rows
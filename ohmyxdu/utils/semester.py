@@ -0,0 +1,201 @@
+"""
+学年学期信息
+
+当前学年学期与学期开始时间来自 ehall 课程表应用，对所有用户都相同，一年只变两次。
+查询结果保存在结果缓存中，所有用户与插件共用，命中时不需要登录也不需要请求。
+
+可在配置文件的 [CACHE.TTL] 中调整有效期:
+[CACHE.TTL]
+semester = 86400  # 当前学年学期，学期交替时最多滞后这么久
+semester_start = 2592000  # 学期开始时间，确定后基本不会再变
+"""
+
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+from datetime import datetime
+from threading import Lock
+
+from ohmyxdu.log import logger
+from ohmyxdu.cache import cached_call, get_result_cache
+
+if TYPE_CHECKING:
+    from ohmyxdu.auth.ids import IDSAuth
+
+__all__ = (
+    "YearSemester",
+    "get_semester_code",
+    "parse_year_semester",
+    "parse_start_time",
+    "start_time_query",
+    "get_latest_year_semester",
+    "get_start_time",
+    "latest_year_semester",
+    "semester_start_time",
+    "prefetch_semester_info",
+    "invalidate_semester_info",
+)
+
+BASE_URL = "http://ehall.xidian.edu.cn"
+SERVICE_URL = BASE_URL + "/appShow?appId=4770397878132218"
+YEAR_SEMESTER_URL = BASE_URL + "/jwapp/sys/wdkb/modules/jshkcb/dqxnxq.do"
+YEAR_SEMESTER_INFO_URL = BASE_URL + "/jwapp/sys/wdkb/modules/jshkcb/cxjcs.do"
+
+SEMESTER_TTL = 24 * 60 * 60
+START_TIME_TTL = 30 * 24 * 60 * 60
+
+T = TypeVar("T")
+
+# 批量执行时多个用户同时未命中同一项，只让一个去请求，其余等它写入缓存后直接命中
+# 锁按缓存键区分，命中时不加锁，不同项之间也互不阻塞
+_fetch_locks: Dict[tuple, Lock] = {}
+_fetch_locks_guard = Lock()
+
+
+class YearSemester(NamedTuple):
+    school_year: int
+    semester: int
+
+
+def get_semester_code(year_semester: YearSemester) -> str:
+    """
+    学年学期代号转换
+
+    :param year_semester: 学年学期对象
+    :return: 形如 '2019-2020-1' 的学年学期代号
+    >>> get_semester_code(YearSemester(2019,1))
+    '2019-2020-1'
+    """
+
+    return f"{year_semester.school_year}-{year_semester.school_year + 1}-{year_semester.semester}"
+
+
+def parse_year_semester(rows: List[dict]) -> YearSemester:
+    """
+    解析 dqxnxq 接口返回的当前学年学期
+
+    :param rows: 接口返回的 rows
+    :return:
+    """
+
+    data = rows[0]["DM"].split("-")
+    return YearSemester(int(data[0]), int(data[2]))
+
+
+def start_time_query(year_semester: YearSemester) -> dict:
+    semester_code = get_semester_code(year_semester)
+    return {"XN": semester_code[:-2], "XQ": semester_code[-1:]}
+
+
+def parse_start_time(rows: List[dict]) -> datetime:
+    """
+    解析 cxjcs 接口返回的学期开始时间
+
+    :param rows: 接口返回的 rows
+    :return:
+    """
+
+    return datetime.strptime(rows[0]["XQKSRQ"], "%Y-%m-%d %H:%M:%S")
+
+
+def get_latest_year_semester(token: "IDSAuth") -> YearSemester:
+    """
+    获取当前学年学期，不经过缓存
+
+    :param token: 已通过课程表应用验证的 IDS 令牌
+    :return:
+    """
+
+    from ohmyxdu.utils.jwapp import JwappClient
+
+    return parse_year_semester(JwappClient(token).rows(YEAR_SEMESTER_URL))
+
+
+def get_start_time(token: "IDSAuth", year_semester: YearSemester) -> datetime:
+    """
+    获取指定学期开始时间，不经过缓存
+
+    :param token: 已通过课程表应用验证的 IDS 令牌
+    :param year_semester: 学年学期
+    :return:
+    """
+
+    from ohmyxdu.utils.jwapp import JwappClient
+
+    rows = JwappClient(token).rows(YEAR_SEMESTER_INFO_URL, start_time_query(year_semester))
+    return parse_start_time(rows)
+
+
+def _fetch_lock(key: tuple) -> Lock:
+    with _fetch_locks_guard:
+        return _fetch_locks.setdefault(key, Lock())
+
+
+def _shared(name: str, ttl: float, key: tuple, func: Callable[[], T]) -> T:
+    return cached_call(name, ttl, key, func, per_user=False, lock=_fetch_lock(key))
+
+
+def _token(token: Optional["IDSAuth"]) -> "IDSAuth":
+    if token is not None:
+        return token
+
+    from ohmyxdu.auth.ids import IDSAuth
+
+    return IDSAuth(SERVICE_URL)
+
+
+def latest_year_semester(token: Optional["IDSAuth"] = None) -> YearSemester:
+    """
+    当前学年学期，所有用户共用缓存
+
+    :param token: 已通过课程表应用验证的 IDS 令牌，为空时只在未命中时登录
+    :return:
+    """
+
+    return _shared(
+        "semester",
+        SEMESTER_TTL,
+        ("latest_year_semester",),
+        lambda: get_latest_year_semester(_token(token)),
+    )
+
+
+def semester_start_time(
+    year_semester: YearSemester, token: Optional["IDSAuth"] = None
+) -> datetime:
+    """
+    学期开始时间，所有用户共用缓存
+
+    :param year_semester: 学年学期
+    :param token: 已通过课程表应用验证的 IDS 令牌，为空时只在未命中时登录
+    :return:
+    """
+
+    return _shared(
+        "semester_start",
+        START_TIME_TTL,
+        ("semester_start_time", tuple(year_semester)),
+        lambda: get_start_time(_token(token), year_semester),
+    )
+
+
+def prefetch_semester_info(token: Optional["IDSAuth"] = None) -> Tuple[YearSemester, datetime]:
+    """
+    预先填充当前学期的缓存，例如在批量执行前调用，之后各用户都能直接命中
+
+    :param token: 已通过课程表应用验证的 IDS 令牌，为空时只在未命中时登录
+    :return: (当前学年学期, 学期开始时间)
+    """
+
+    year_semester = latest_year_semester(token)
+    return year_semester, semester_start_time(year_semester, token)
+
+
+def invalidate_semester_info():
+    """清除学期信息缓存，例如学校调整了校历时"""
+
+    cache = get_result_cache()
+    if cache is None:
+        return
+
+    for name in ("semester", "semester_start"):
+        cache.clear(name)
+    logger.debug("已清除学期信息缓存")